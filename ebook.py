@@ -6,11 +6,34 @@ HTML paragraphs, and a create_epub function that builds an EPUB file
 from title and chapter tuples. The module also contains a small script
 section that reads novels and chapters from a PostgreSQL database and
 generates EPUB files for each novel.
+
+The export is incremental: a fingerprint of every novel (its metadata and
+a digest of its chapters, computed by PostgreSQL) is kept in a manifest in
+the output directory, and only novels whose fingerprint changed are
+rebuilt. Changed novels are built in parallel on a process pool, each
+worker streaming chapters through a server-side cursor.
 """
 
+import argparse
+import hashlib
+import html
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from ebooklib import epub
 from bs4 import BeautifulSoup
 
+from novel.compression import decompress
+from novel.normalize import VERSION, normalize_content
+
+# create_epub also runs inside the web app (novel.books), so it logs
+# rather than prints; main() prints its own progress.
+logger = logging.getLogger(__name__)
+
 
 def text_to_html(text):
     """
@@ -41,17 +64,36 @@ def html_to_text(html):
     return soup.get_text(separator="\n")
 
 
-def create_epub(title, chapters, novel_image=None, description=None):
+def create_epub(
+    title,
+    chapters,
+    novel_image=None,
+    description=None,
+    output_dir=".",
+    file_name=None,
+    media_root="../media",
+):
     """
     Create an EPUB file from a title and an iterable of chapters.
 
     Args:
         title (str): Title of the book / EPUB filename (without extension).
         chapters (iterable): Sequence of (chapter_title, chapter_content) tuples.
-                             chapter_content may be plain text or HTML.
+                             chapter_content is normalized HTML (see
+                             novel.normalize), a run of <p> elements that
+                             is inserted as is.
+        description (str): HTML or plain text; normalized the same way.
+        output_dir (str): Directory to write to.
+        file_name (str): Name of the file; defaults to '{title}.epub'.
+        media_root (str): Directory novel_image is relative to.
+
+    Returns:
+        str: Path of the written file.
 
     Side effects:
-        Writes an EPUB file named '{title}.epub' to the current working directory.
+        Writes the EPUB file to output_dir. The file is written under a
+        temporary name and renamed into place, so an interrupted run never
+        leaves a truncated book behind.
     """
     book = epub.EpubBook()
     book.set_title(title)
@@ -60,25 +102,25 @@ def create_epub(title, chapters, novel_image=None, description=None):
         des = epub.EpubHtml(
             title="Description", file_name="description.xhtml", lang="en"
         )
-        des.content = f"<h1>Description</h1><p>{description}</p>"
+        des.content = f"<h1>Description</h1>{normalize_content(description)}"
         book.add_item(des)
         book.toc.append(epub.Link("description.xhtml", "Description", "description"))
         book.spine.append(des)
     try:
         if novel_image:
-            with open(f"../media/{novel_image}", "rb") as img_file:
+            with open(os.path.join(media_root, novel_image), "rb") as img_file:
                 book.set_cover(novel_image, img_file.read())
 
     except Exception as e:
-        print(f"Could not set cover image: {e}")
+        logger.warning("Could not set cover image: %s", e)
 
     for i, (chapter_title, chapter_content) in enumerate(chapters):
-        if "window.pubfuturetag" in chapter_content:
-            chapter_content = text_to_html(html_to_text(chapter_content))
         chapter = epub.EpubHtml(
             title=chapter_title, file_name=f"chap_{i + 1}.xhtml", lang="en"
         )
-        chapter.content = f"<h1>{chapter_title}</h1><p>{chapter_content}</p>"
+        chapter.content = (
+            f"<h1>{html.escape(chapter_title, quote=False)}</h1>{chapter_content}"
+        )
         book.add_item(chapter)
         book.toc.append(
             epub.Link(f"chap_{i + 1}.xhtml", chapter_title, f"chap_{i + 1}")
@@ -87,48 +129,229 @@ def create_epub(title, chapters, novel_image=None, description=None):
 
     book.add_item(epub.EpubNcx())
     book.add_item(epub.EpubNav())
-    epub.write_epub(f"{title}.epub", book, {})
-    print(f"Created EPUB: {title}.epub")
+
+    path = os.path.join(output_dir, file_name or f"{title}.epub")
+    fd, temp = tempfile.mkstemp(suffix=".tmp", dir=output_dir)
+    os.close(fd)
+    try:
+        epub.write_epub(temp, book, {})
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    logger.info("Created EPUB: %s", path)
+    return path
+
+
+MANIFEST = ".ebook-manifest.json"
+
+# Chapters fetched per round trip by the server-side cursor.
+ITERSIZE = 200
+
+# One row per novel. The chapter digest is computed in the database, so
+# checking an unchanged novel transfers a hash instead of its chapters.
+FINGERPRINT_QUERY = """
+    SELECT n.id, n.title, n.novel_image, n.description, count(c.id),
+        md5(coalesce(string_agg(
+            concat_ws(':', c.num, md5(c.title), c.content_version,
+                md5(coalesce(c.content, convert_to(c.content_text, 'UTF8')))),
+            ',' ORDER BY c.num, c.id
+        ), ''))
+    FROM novel_novel n LEFT JOIN novel_chapter c ON c.novel_id = n.id
+    GROUP BY n.id
+    ORDER BY n.id
+"""
 
 
-def main():
+def connect():
     """
-    Main script to export novels and chapters from a PostgreSQL database
-    into individual EPUB files.
+    Open a PostgreSQL connection from the DB_* environment variables.
     """
     from dotenv import load_dotenv
     import psycopg2
-    import os
 
     load_dotenv()
 
-    psql = psycopg2.connect(
+    return psycopg2.connect(
         host=os.getenv("DB_HOST"),
         database=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         port=os.getenv("DB_PORT"),
     )
-    cursor = psql.cursor()
 
-    cursor.execute(
-        "SELECT id, title, novel_image, description FROM novel_novel ORDER BY id ASC"
-    )
-    novels = cursor.fetchall()
 
-    for id, novel_title, novel_image, description in novels:
-        cursor.execute(
-            "SELECT title, content FROM novel_chapter WHERE novel_id = %s ORDER BY num",
-            (id,),
+def fingerprint(title, novel_image, description, chapter_digest):
+    """
+    Return a digest of everything an exported EPUB is built from.
+
+    VERSION is included because rows not yet normalized are normalized at
+    export time, so new rules change the output of unchanged rows.
+    """
+    data = json.dumps([VERSION, title, novel_image, description, chapter_digest])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+# Per worker process, set up by init_worker.
+_connection = None
+_dictionaries = {}
+
+
+def init_worker():
+    global _connection
+    _connection = connect()
+
+
+def load_dictionary(id):
+    if id not in _dictionaries:
+        with _connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT data FROM novel_contentdictionary WHERE id = %s", (id,)
+            )
+            _dictionaries[id] = bytes(cursor.fetchone()[0])
+    return _dictionaries[id]
+
+
+def export_novel(id, novel_title, novel_image, description, output_dir):
+    """
+    Build the EPUB of one novel in a worker process.
+
+    Returns:
+        tuple: (path, chapters written, bytes written).
+    """
+    count = 0
+
+    def chapters():
+        nonlocal count
+        # A named cursor is a server-side cursor: rows arrive ITERSIZE at a
+        # time instead of the whole novel at once.
+        with _connection.cursor(name=f"export_{id}") as cursor:
+            cursor.itersize = ITERSIZE
+            cursor.execute(
+                "SELECT title, content, content_text, content_version "
+                "FROM novel_chapter WHERE novel_id = %s ORDER BY num",
+                (id,),
+            )
+            for title, content, text, version in cursor:
+                if content is not None:
+                    text = decompress(content, load_dictionary)
+                # Rows not yet run through normalize_chapters.
+                if version < VERSION:
+                    text = normalize_content(text)
+                count += 1
+                yield title, text
+
+    try:
+        path = create_epub(
+            novel_title, chapters(), novel_image, description, output_dir
         )
+    finally:
+        _connection.rollback()
+    return path, count, os.path.getsize(path)
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(manifest, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
 
-        chapters = cursor.fetchall()
-        create_epub(novel_title, chapters, novel_image, description)
 
-    cursor.close()
+def main(argv=None):
+    """
+    Main script to export novels and chapters from a PostgreSQL database
+    into individual EPUB files, rebuilding only novels that changed since
+    the last run.
+    """
+    parser = argparse.ArgumentParser(description="Export every novel as an EPUB.")
+    parser.add_argument("--output", default=".", help="Output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--force", action="store_true", help="Rebuild unchanged novels too"
+    )
+    args = parser.parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+
+    psql = connect()
+    with psql.cursor() as cursor:
+        cursor.execute(FINGERPRINT_QUERY)
+        novels = cursor.fetchall()
     psql.close()
 
+    # {novel id: {"fingerprint": ..., "file": ...}}
+    manifest = load_manifest(args.output)
+    ids = {str(novel[0]) for novel in novels}
+    for id in set(manifest) - ids:
+        # Deleted novels.
+        remove(os.path.join(args.output, manifest.pop(id)["file"]))
+
+    changed = []
+    for id, novel_title, novel_image, description, _, digest in novels:
+        key = fingerprint(novel_title, novel_image, description, digest)
+        entry = manifest.get(str(id))
+        if (
+            args.force
+            or entry is None
+            or entry["fingerprint"] != key
+            or not os.path.exists(os.path.join(args.output, entry["file"]))
+        ):
+            changed.append((id, novel_title, novel_image, description, key))
+    print(f"{len(changed)} of {len(novels)} novels changed")
+
+    start = time.perf_counter()
+    chapters = size = failed = 0
+    try:
+        with ProcessPoolExecutor(args.workers, initializer=init_worker) as pool:
+            futures = {
+                pool.submit(export_novel, *novel[:4], args.output): novel
+                for novel in changed
+            }
+            for future in as_completed(futures):
+                id, novel_title, _, _, key = futures[future]
+                try:
+                    path, count, written = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Could not export {novel_title}: {e}")
+                    continue
+
+                name = os.path.basename(path)
+                old = manifest.get(str(id))
+                if old and old["file"] != name:
+                    # Renamed novel.
+                    remove(os.path.join(args.output, old["file"]))
+                manifest[str(id)] = {"fingerprint": key, "file": name}
+                print(f"Created EPUB: {path}")
+                chapters += count
+                size += written
+    finally:
+        save_manifest(args.output, manifest)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    mb = size / 1024 / 1024
+    print(
+        f"Exported {len(changed) - failed} novels ({failed} failed, "
+        f"{len(novels) - len(changed)} unchanged): {chapters} chapters, "
+        f"{mb:.1f} MB in {elapsed:.1f}s ({chapters / elapsed:.0f} chapters/s, "
+        f"{mb / elapsed:.1f} MB/s)"
+    )
+
 
 if __name__ == "__main__":
     main()
-
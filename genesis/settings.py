@@ -21,6 +21,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
+
+# Built EPUBs served by the download view (see novel.books).
+BOOK_ROOT = config("BOOK_ROOT", default=os.path.join(BASE_DIR, "books"))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -42,6 +46,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "novel",
 ]
 
@@ -147,3 +152,12 @@ CACHES = {
         "TIMEOUT": 3600,
     }
 }
+
+# Serve the chapter and novel pages with their async views. Only worth it
+# when running under ASGI (e.g. uvicorn genesis.asgi:application); under
+# WSGI every async view runs in its own event loop.
+ASYNC_VIEWS = config("ASYNC_VIEWS", default=False, cast=bool)
+
+# Identifies the deployed code in page ETags (novel.conditional); defaults
+# to a digest of the app's code and templates.
+RELEASE = config("RELEASE", default="")
@@ -1,5 +1,14 @@
 from django.contrib import admin
-from novel.models import Chapter, Comment, Genre, Novel, Rating, Tag, User
+from novel.models import (
+    AuthorStats,
+    Chapter,
+    Comment,
+    Genre,
+    Novel,
+    Rating,
+    Tag,
+    User,
+)
 
 
 class UserAdmin(admin.ModelAdmin):
@@ -37,3 +46,4 @@ admin.site.register(Genre)
 admin.site.register(Comment)
 admin.site.register(Tag)
 admin.site.register(Rating)
+admin.site.register(AuthorStats)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NovelConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "novel"
+
+    def ready(self):
+        from novel import signals  # noqa: F401
@@ -0,0 +1,56 @@
+"""
+Asyncio access to the Redis server behind the default cache.
+
+The async views cannot use ``get_redis_connection`` without blocking the
+event loop, so they get a ``redis.asyncio`` client on the same server and
+connection settings. Connections belong to an event loop, so there is one
+client per loop (in practice one per ASGI worker).
+
+``cache_get_many`` reads keys written through the Django cache API, using
+the cache's own key prefixing and (de)serialization.
+"""
+
+import asyncio
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.asyncio import Redis
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_connection():
+    """
+    Return the asyncio Redis client of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        options = settings.CACHES["default"].get("OPTIONS", {})
+        client = _clients[loop] = Redis.from_url(
+            settings.CACHES["default"]["LOCATION"],
+            **options.get("CONNECTION_POOL_KWARGS", {}),
+        )
+    return client
+
+
+async def cache_get_many(keys, sizes=None):
+    """
+    Async ``cache.get_many``: return {key: value} for the keys present.
+
+    Args:
+        sizes (dict): If given, filled with {key: stored size in bytes}.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    client = cache.client
+    values = await get_connection().mget([client.make_key(key) for key in keys])
+    found = {}
+    for key, value in zip(keys, values):
+        if value is not None:
+            found[key] = client.decode(value)
+            if sizes is not None:
+                sizes[key] = len(value)
+    return found
@@ -0,0 +1,268 @@
+"""
+On-demand EPUB downloads.
+
+Books are built with ``ebook.create_epub`` and kept on disk under
+``settings.BOOK_ROOT`` as ``<novel id>-<version>.epub``, where the version
+is that of the novel's ``book:<id>`` cache tag (see ``novel.caching``). The
+tag is bumped only when chapters or the novel's title, description or cover
+change, not by comments or ratings, so a book is built once per change
+however often it is downloaded.
+
+On a miss ``get_book`` starts a build on a small background thread pool,
+at most one per novel across all workers (a Redis lock), and returns None;
+the download view answers 202 until the file exists. The lock is short and
+renewed while the build runs, so if the building process dies another
+worker takes over within ``LOCK_TIMEOUT``. Files are written
+under a temporary name and renamed into place, so a file that exists is
+complete.
+"""
+
+import glob
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header
+from redis.exceptions import LockError
+
+from ebook import create_epub
+from novel.caching import versions
+from novel.models import Chapter, Novel
+from novel.normalize import VERSION, normalize_content
+
+BUILD_WORKERS = 2
+LOCK_TIMEOUT = 30
+# A failed build is not retried for this long.
+FAILURE_TTL = 60
+# Seconds clients are asked to wait between polls.
+RETRY_AFTER = 2
+
+CHAPTER_CHUNK = 200
+BLOCK_SIZE = 64 * 1024
+CONTENT_TYPE = "application/epub+zip"
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_executor = ThreadPoolExecutor(max_workers=BUILD_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+
+class BuildFailed(Exception):
+    pass
+
+
+def book_tag(novel_id):
+    return f"book:{novel_id}"
+
+
+def _path(novel_id, version):
+    return os.path.join(settings.BOOK_ROOT, f"{novel_id}-{version}.epub")
+
+
+def _versions(novel_id):
+    # {version: path} of the files on disk.
+    found = {}
+    for path in glob.glob(os.path.join(settings.BOOK_ROOT, f"{novel_id}-*.epub")):
+        version = os.path.basename(path)[len(f"{novel_id}-") : -len(".epub")]
+        if version.isdigit():
+            found[int(version)] = path
+    return found
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _chapters(novel_id):
+    chapters = (
+        Chapter.objects.filter(novel_id=novel_id)
+        .order_by("num")
+        .only("title", "content", "content_text", "content_version")
+    )
+    # Streamed (a server-side cursor on PostgreSQL), not loaded at once.
+    for chapter in chapters.iterator(chunk_size=CHAPTER_CHUNK):
+        content = chapter.content
+        # Rows not yet run through normalize_chapters.
+        if chapter.content_version < VERSION:
+            content = normalize_content(content)
+        yield chapter.title, content
+
+
+def build_book(novel_id, version):
+    """
+    Write the book of a novel for ``version`` and remove older versions.
+
+    Returns:
+        str: Path of the book.
+    """
+    novel = Novel.objects.get(pk=novel_id)
+    os.makedirs(settings.BOOK_ROOT, exist_ok=True)
+    path = create_epub(
+        novel.title,
+        _chapters(novel_id),
+        novel.novel_image.name or None,
+        novel.description,
+        settings.BOOK_ROOT,
+        file_name=os.path.basename(_path(novel_id, version)),
+        media_root=settings.MEDIA_ROOT,
+    )
+    # Only older ones: a slow build must not remove a newer book. Readers
+    # still downloading an old file keep it open until they are done.
+    for old, old_path in _versions(novel_id).items():
+        if old < version:
+            _remove(old_path)
+    return path
+
+
+def _failed_key(novel_id, version):
+    return f"{book_tag(novel_id)}:{version}:failed"
+
+
+def _renew(lock, done):
+    while not done.wait(LOCK_TIMEOUT / 3):
+        try:
+            lock.extend(LOCK_TIMEOUT, replace_ttl=True)
+        except LockError:
+            return
+
+
+def _build(novel_id, version, lock):
+    done = threading.Event()
+    threading.Thread(target=_renew, args=(lock, done), daemon=True).start()
+    try:
+        if not os.path.exists(_path(novel_id, version)):
+            build_book(novel_id, version)
+    except Exception:
+        logger.exception("Building the book of novel %s failed", novel_id)
+        cache.set(_failed_key(novel_id, version), True, FAILURE_TTL)
+    finally:
+        done.set()
+        try:
+            lock.release()
+        except LockError:
+            # The build outlived the lock, which may now belong to another
+            # worker.
+            pass
+        connection.close()
+
+
+def get_book(novel_id):
+    """
+    Return (path, version) of the current book of a novel. The path is
+    None while the book is being built.
+
+    Raises:
+        BuildFailed: If the last build of this version failed.
+    """
+    tag = book_tag(novel_id)
+    version = versions([tag])[tag]
+    path = _path(novel_id, version)
+    if os.path.exists(path):
+        return path, version
+    if cache.get(_failed_key(novel_id, version)):
+        raise BuildFailed
+
+    # The lock is released by the build thread, hence not thread local.
+    lock = cache.lock(f"{tag}:lock", timeout=LOCK_TIMEOUT, thread_local=False)
+    if lock.acquire(blocking=False):
+        _executor.submit(_build, novel_id, version, lock)
+    return None, version
+
+
+def delete_books(novel_id):
+    """
+    Remove every book of a novel from disk once the current transaction
+    commits.
+    """
+    transaction.on_commit(
+        lambda: [_remove(path) for path in _versions(novel_id).values()]
+    )
+
+
+def parse_range(header, size):
+    """
+    Return the (first, last) byte positions of a single range ``Range``
+    header, or None to send the whole file.
+
+    Raises:
+        ValueError: If the range is not satisfiable.
+    """
+    match = RANGE.match(header.strip())
+    if not match or not (match[1] or match[2]):
+        # Malformed or several ranges: ignoring the header is allowed.
+        return None
+    if not match[1]:
+        # The last N bytes.
+        length = int(match[2])
+        if not length:
+            raise ValueError
+        return max(size - length, 0), size - 1
+
+    first = int(match[1])
+    last = min(int(match[2]), size - 1) if match[2] else size - 1
+    if match[2] and int(match[2]) < first:
+        return None
+    if first >= size:
+        raise ValueError
+    return first, last
+
+
+def _read(file, length):
+    with file:
+        while length > 0:
+            block = file.read(min(BLOCK_SIZE, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+
+def serve_book(request, path, filename, etag):
+    """
+    Return a response sending the book at ``path`` as an attachment,
+    honoring ``If-None-Match``, ``Range`` and ``If-Range``.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    size = os.path.getsize(path)
+    header = request.headers.get("Range")
+    if header and request.headers.get("If-Range", etag) != etag:
+        # The client's partial copy is of an older book.
+        header = None
+    try:
+        byte_range = parse_range(header, size) if header else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(path, "rb")
+    if byte_range is None:
+        response = FileResponse(
+            file, as_attachment=True, filename=filename, content_type=CONTENT_TYPE
+        )
+    else:
+        first, last = byte_range
+        file.seek(first)
+        response = StreamingHttpResponse(
+            _read(file, last - first + 1), status=206, content_type=CONTENT_TYPE
+        )
+        response["Content-Length"] = last - first + 1
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    return response
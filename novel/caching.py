@@ -0,0 +1,276 @@
+"""
+Stampede-safe view caching.
+
+``cached`` wraps the get -> miss -> rebuild -> set pattern of the views:
+
+* Single flight: on a miss only the worker holding a Redis lock rebuilds
+  the value; the others poll for it for at most ``LOCK_WAIT`` seconds
+  before building it themselves uncached.
+* Early refresh: each entry records how long it took to build, and a
+  reader may refresh it before it expires with a probability that grows as
+  expiry nears and with the build cost (the "XFetch" rule
+  ``now - delta * beta * log(random()) >= expiry``), so hot keys are
+  normally rebuilt before they ever miss.
+* Stale while revalidate: entries are kept for ``STALE_TTL`` seconds past
+  their expiry; while one worker refreshes them the rest keep serving the
+  old value.
+* Dependency tags: an entry can declare the objects it was built from,
+  e.g. ``tags=["novel:1"]``. Each tag has a version counter, bumped by the
+  signal handlers in ``novel.signals`` through ``invalidate``; an entry
+  built under older versions is never served. The time of the last bump
+  is kept too (``modified``), for Last-Modified headers.
+* Local tier: entries are also kept in a bounded per-process LRU (see
+  ``novel.localcache``), evicted across workers over Redis pub/sub, so hot
+  keys are served without a Redis round trip.
+
+``acached`` is the same for async views: fresh entries are read from the
+local tier or with one asyncio Redis round trip, and everything else
+(misses, early refreshes) goes through ``cached`` in a thread.
+"""
+
+import math
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from redis.exceptions import LockError
+
+from novel.asyncredis import cache_get_many
+from novel.localcache import count, local, publish
+
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2
+POLL_INTERVAL = 0.05
+
+STALE_TTL = 60
+EARLY_EXPIRY_BETA = 1.0
+
+
+def _tag_key(tag):
+    return f"tag:{tag}"
+
+
+def _modified_key(tag):
+    return f"tag:{tag}:modified"
+
+
+def versions(tags):
+    """
+    Return the current {tag: version} of ``tags``.
+    """
+    keys = [_tag_key(tag) for tag in tags]
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            # A counter that was evicted restarts from a fresh value, so
+            # entries built under the old one no longer match.
+            cache.add(key, time.time_ns(), None)
+            current[key] = cache.get(key)
+    return {tag: current[key] for tag, key in zip(tags, keys)}
+
+
+async def aversions(tags):
+    """
+    Async ``versions``.
+    """
+    keys = [_tag_key(tag) for tag in tags]
+    current = await cache_get_many(keys)
+    if len(current) < len(keys):
+        return await sync_to_async(versions)(tags)
+    return {tag: current[key] for tag, key in zip(tags, keys)}
+
+
+def modified(tags):
+    """
+    Return when any of ``tags`` was last invalidated, as a Unix timestamp.
+    """
+    keys = [_modified_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Unknown since it was evicted: count from now.
+            cache.add(key, time.time(), None)
+            found[key] = cache.get(key)
+    return max((found[key] for key in keys), default=0)
+
+
+async def amodified(tags):
+    """
+    Async ``modified``.
+    """
+    found = await cache_get_many([_modified_key(tag) for tag in tags])
+    if len(found) < len(tags):
+        return await sync_to_async(modified)(tags)
+    return max(found.values(), default=0)
+
+
+def _bump(tags):
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            cache.set(_tag_key(tag), time.time_ns(), None)
+    now = time.time()
+    cache.set_many({_modified_key(tag): now for tag in tags}, None)
+    publish(tags=tags)
+
+
+def invalidate(*tags):
+    """
+    Invalidate every entry depending on ``tags`` once the current
+    transaction commits, e.g. ``invalidate("novel:1", "user:2")``.
+    """
+    transaction.on_commit(lambda: _bump(tags))
+
+
+def _entry(key, tags=()):
+    keys = [_tag_key(tag) for tag in tags]
+    return _current(key, tags, keys, cache.get_many([key, *keys]))
+
+
+async def _aentry(key, tags=(), sizes=None):
+    keys = [_tag_key(tag) for tag in tags]
+    return _current(key, tags, keys, await cache_get_many([key, *keys], sizes))
+
+
+def _current(key, tags, keys, values):
+    entry = values.get(key)
+    # Anything else was written by plain cache.set() and is treated as a miss.
+    if not (isinstance(entry, tuple) and len(entry) == 4):
+        return None
+    built = entry[3]
+    if any(built.get(tag) != values.get(k) for tag, k in zip(tags, keys)):
+        return None
+    return entry
+
+
+def _release(lock):
+    try:
+        lock.release()
+    except LockError:
+        # The lock timed out during a slow build and may now belong to
+        # another worker; leave it alone.
+        pass
+
+
+def _write(key, value, timeout, delta, built):
+    if timeout is None:
+        entry = (value, math.inf, delta, built)
+        cache.set(key, entry, None)
+    else:
+        entry = (value, time.time() + timeout, delta, built)
+        cache.set(key, entry, timeout + STALE_TTL)
+    return entry
+
+
+def store(key, value, timeout=None):
+    """
+    Cache ``value`` in the format ``cached`` reads, replacing it in every
+    worker.
+
+    Args:
+        timeout (int): Seconds until the value should be refreshed, or None
+            to keep it until it is replaced.
+    """
+    _write(key, value, timeout, 0, {})
+    publish(keys=[key])
+    return value
+
+
+def read(key, tags=()):
+    entry = _entry(key, tags)
+    return entry[0] if entry else None
+
+
+def _build(key, build, timeout, tags):
+    # Read the versions first: a change committed during the build then
+    # leaves the entry already outdated instead of hiding the change.
+    built = versions(tags) if tags else {}
+    generation = local.generation
+    start = time.monotonic()
+    value = build()
+    entry = _write(key, value, timeout, time.monotonic() - start, built)
+    local.set(key, entry, tags, generation)
+    return value
+
+
+def cached(key, build, timeout=cache.default_timeout, tags=()):
+    """
+    Return the cached value for ``key``, building it with ``build()`` if
+    needed.
+
+    Args:
+        key (str): Cache key. ``cache.delete(key)`` invalidates it.
+        build: Zero-argument callable returning the value.
+        timeout (int): Seconds until the value is refreshed, or None for
+            values that are only ever invalidated explicitly.
+        tags (list): Dependency tags such as "novel:1"; the entry is
+            rebuilt after ``invalidate`` is called for any of them.
+    """
+    tags = list(tags)
+    generation = local.generation
+    entry = local.get(key)
+    if entry:
+        count("local")
+    else:
+        entry = _entry(key, tags)
+        if entry:
+            count("redis")
+            local.set(key, entry, tags, generation)
+
+    lock = cache.lock(f"{key}:lock", timeout=LOCK_TIMEOUT)
+    if entry:
+        if _fresh(entry) or not lock.acquire(blocking=False):
+            return entry[0]
+        try:
+            return _build(key, build, timeout, tags)
+        finally:
+            _release(lock)
+
+    count("miss")
+    if lock.acquire(blocking=False):
+        try:
+            return _build(key, build, timeout, tags)
+        finally:
+            _release(lock)
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = _entry(key, tags)
+        if entry:
+            return entry[0]
+
+    # The rebuilding worker is stuck or slow; don't make this request fail.
+    return build()
+
+
+def _fresh(entry):
+    value, expiry, delta, _ = entry
+    gap = -delta * EARLY_EXPIRY_BETA * math.log(1 - random.random())
+    return time.time() + gap < expiry
+
+
+async def acached(key, build, timeout=cache.default_timeout, tags=()):
+    """
+    Async ``cached``; ``build`` is still a plain (synchronous) callable.
+    """
+    tags = list(tags)
+    generation = local.generation
+    entry = local.get(key)
+    tier = "local"
+    if not entry:
+        sizes = {}
+        entry = await _aentry(key, tags, sizes)
+        tier = "redis"
+        if entry:
+            # Sized by the bytes read rather than by pickling the entry
+            # again on the event loop.
+            local.set(key, entry, tags, generation, sizes[key])
+
+    if entry and _fresh(entry):
+        count(tier)
+        return entry[0]
+    return await sync_to_async(cached)(key, build, timeout, tags)
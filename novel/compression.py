@@ -0,0 +1,140 @@
+"""
+Compressed text storage.
+
+Chapter bodies are stored as zlib streams, optionally primed with a shared
+dictionary trained on our own chapters (``train_dictionary``). Chapters are
+short and highly repetitive across the corpus (markup, recurring names and
+phrases), which a per-row compressor cannot exploit but a preset dictionary
+can.
+
+Stored values start with a format byte:
+
+* ``RAW`` followed by a plain zlib stream.
+* ``DICT`` followed by a 4-byte big-endian ``ContentDictionary`` id and a
+  zlib stream compressed with that dictionary.
+
+This module does not import Django models at load time, so standalone
+scripts such as ``ebook.py`` can decode rows with their own dictionary
+loader.
+"""
+
+import re
+import struct
+import time
+import zlib
+from collections import Counter
+
+RAW = b"\x01"
+DICT = b"\x02"
+
+LEVEL = 6
+DICTIONARY_SIZE = 32 * 1024
+
+# How long a process keeps using the newest dictionary before checking for
+# a newer one.
+ACTIVE_DICTIONARY_TTL = 300
+
+_dictionaries = {}
+_active = (None, None)
+
+
+def _load_dictionary(id):
+    from novel.models import ContentDictionary
+
+    if id not in _dictionaries:
+        _dictionaries[id] = bytes(ContentDictionary.objects.get(pk=id).data)
+    return _dictionaries[id]
+
+
+def active_dictionary():
+    """
+    Return (id, data) of the newest dictionary, or (None, None).
+    """
+    from novel.models import ContentDictionary
+
+    global _active
+    id, checked = _active
+    if checked is None or time.monotonic() - checked > ACTIVE_DICTIONARY_TTL:
+        newest = ContentDictionary.objects.order_by("-id").values_list("id", flat=True)
+        id = newest.first()
+        _active = (id, time.monotonic())
+    return (id, _load_dictionary(id)) if id else (None, None)
+
+
+def compress(text, dictionary=None):
+    """
+    Compress ``text``, by default with the newest shared dictionary.
+
+    Args:
+        dictionary (tuple): (id, data) to use instead, or (None, None) for
+            no dictionary.
+    """
+    id, data = dictionary or active_dictionary()
+    if id is None:
+        return RAW + zlib.compress(text.encode(), LEVEL)
+
+    compressor = zlib.compressobj(LEVEL, zdict=data)
+    body = compressor.compress(text.encode()) + compressor.flush()
+    return DICT + struct.pack(">I", id) + body
+
+
+def decompress(data, load_dictionary=_load_dictionary):
+    """
+    Decode a value produced by ``compress``.
+
+    Args:
+        load_dictionary: Callable returning the dictionary bytes for an id.
+    """
+    data = bytes(data)
+    if data[:1] == RAW:
+        return zlib.decompress(data[1:]).decode()
+
+    (id,) = struct.unpack(">I", data[1:5])
+    decompressor = zlib.decompressobj(zdict=load_dictionary(id))
+    return (decompressor.decompress(data[5:]) + decompressor.flush()).decode()
+
+
+def dictionary_id(data):
+    data = bytes(data)
+    return struct.unpack(">I", data[1:5])[0] if data[:1] == DICT else None
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """
+    Build a zlib preset dictionary from sample texts.
+
+    Word sequences of one to four tokens (tags included) are scored by how
+    many bytes they would save across the samples. The best are packed into
+    ``size`` bytes with the most valuable last, since zlib reaches the end
+    of the dictionary with the shortest distances.
+    """
+    counts = Counter()
+    for text in samples:
+        tokens = re.findall(r"<[^>]{0,40}>|[^\s<]+\s*", text)
+        for n in range(1, 5):
+            for i in range(len(tokens) - n + 1):
+                counts["".join(tokens[i : i + n])] += 1
+
+    scored = sorted(
+        (
+            (len(fragment) * (count - 1), fragment)
+            for fragment, count in counts.items()
+            if count > 1 and len(fragment) > 3
+        ),
+        reverse=True,
+    )
+
+    chosen = []
+    used = 0
+    for _, fragment in scored:
+        encoded = fragment.encode()
+        if used + len(encoded) > size:
+            continue
+        if any(fragment in other for other in chosen[-200:]):
+            continue
+        chosen.append(fragment)
+        used += len(encoded)
+        if used >= size - 4:
+            break
+
+    return "".join(reversed(chosen)).encode()
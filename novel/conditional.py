@@ -0,0 +1,127 @@
+"""
+Conditional GET for the reading pages.
+
+A page's ETag is a digest of the versions of the cache tags it is built
+from (see ``novel.caching``) and of the user it is rendered for, so it is
+computed with a single ``get_many`` and without touching the database or
+rendering the template. A client that sends a matching ``If-None-Match``
+gets a bodyless 304 instead of the page.
+
+The ETags are weak: view counts and the CSRF token in the layout change
+between renders without changing what the page says. They also cover the
+deployed code (``RELEASE``), so a deploy that changes the markup is not
+answered with 304s for the old pages.
+
+Pages for anonymous visitors also carry Last-Modified, the later of the
+last invalidation of their tags and the release, for clients that
+revalidate with If-Modified-Since. Signed-in users' pages have per-user
+parts without a modification time, so they are validated by ETag only.
+"""
+
+import hashlib
+import math
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from novel.caching import amodified, aversions, modified, versions
+
+
+def _release():
+    # Templates and code of this app; what a deploy changes.
+    files = sorted(
+        path
+        for path in Path(__file__).resolve().parent.rglob("*")
+        if path.suffix in (".py", ".html") and path.is_file()
+    )
+    digest = hashlib.blake2b(digest_size=12)
+    for path in files:
+        digest.update(path.read_bytes())
+    return (
+        settings.RELEASE or digest.hexdigest(),
+        max((path.stat().st_mtime for path in files), default=0),
+    )
+
+
+RELEASE, RELEASED = _release()
+
+
+def _etag(tag_versions, user, state):
+    viewer = (
+        (user.pk, user.username, user.user_image.name)
+        if user.is_authenticated
+        else None
+    )
+    digest = hashlib.blake2b(
+        repr((RELEASE, sorted(tag_versions.items()), viewer, state)).encode(),
+        digest_size=12,
+    )
+    return f'W/"{digest.hexdigest()}"'
+
+
+def page_etag(request, tags, *state):
+    """
+    Return the ETag of a page built from ``tags`` for ``request.user``.
+
+    Any other cheap-to-read ``state`` the page shows is folded in as well.
+    """
+    return _etag(versions(tags), request.user, state)
+
+
+async def apage_etag(user, tags, *state):
+    """
+    Async ``page_etag``, for the ``user`` from ``await request.auser()``.
+    """
+    return _etag(await aversions(tags), user, state)
+
+
+def page_modified(user, tags):
+    """
+    Return the Last-Modified time of a page built from ``tags``, or None
+    for a signed-in ``user``.
+    """
+    if user.is_authenticated:
+        return None
+    return math.ceil(max(modified(tags), RELEASED))
+
+
+async def apage_modified(user, tags):
+    if user.is_authenticated:
+        return None
+    return math.ceil(max(await amodified(tags), RELEASED))
+
+
+def _validated(response, etag, last_modified, user):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    if user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def respond(request, etag, render, last_modified=None):
+    """
+    Return a 304 if the client already has the page tagged ``etag`` (or,
+    without If-None-Match, one not older than ``last_modified``), otherwise
+    the response of ``render()``.
+
+    Either way the response carries the validators and must be revalidated
+    before reuse; pages rendered for a signed-in user are marked private.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    response = response or render()
+    return _validated(response, etag, last_modified, request.user)
+
+
+async def arespond(request, user, etag, render, last_modified=None):
+    """
+    Async ``respond``; ``render`` is a coroutine function.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    response = response or await render()
+    return _validated(response, etag, last_modified, user)
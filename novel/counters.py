@@ -0,0 +1,190 @@
+"""
+Write-behind view counters.
+
+Page views are accumulated in Redis hashes (one field per novel/chapter id)
+instead of being written to the database on every read. The ``flush_views``
+management command periodically moves the buffered increments into
+``Novel.views`` / ``Chapter.views`` with batched
+``UPDATE ... SET views = views + n`` statements, and refreshes the homepage
+snapshot when the most viewed novels change.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from novel.asyncredis import get_connection
+from novel.homepage import refresh_if_ranking_changed
+from novel.models import Chapter, Novel
+from novel.stats import bump_author_stats
+
+NOVEL_VIEWS_KEY = "genesis:views:novel"
+CHAPTER_VIEWS_KEY = "genesis:views:chapter"
+
+# Flushing renames the live hash to this suffix first, so increments that
+# arrive while the database is being updated land in a fresh hash.
+FLUSHING_SUFFIX = ":flushing"
+
+
+def record_view(chapter_id, novel_id):
+    """
+    Buffer a single page view for a chapter and its novel.
+
+    Args:
+        chapter_id (int): Id of the chapter that was read.
+        novel_id (int): Id of the novel the chapter belongs to.
+    """
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    pipe.hincrby(CHAPTER_VIEWS_KEY, chapter_id, 1)
+    pipe.hincrby(NOVEL_VIEWS_KEY, novel_id, 1)
+    pipe.execute()
+
+
+async def arecord_view(chapter_id, novel_id):
+    pipe = get_connection().pipeline(transaction=False)
+    pipe.hincrby(CHAPTER_VIEWS_KEY, chapter_id, 1)
+    pipe.hincrby(NOVEL_VIEWS_KEY, novel_id, 1)
+    await pipe.execute()
+
+
+def _pending(key, ids):
+    ids = list(ids)
+    if not ids:
+        return {}
+
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    pipe.hmget(key, ids)
+    pipe.hmget(key + FLUSHING_SUFFIX, ids)
+    return _sum_pending(ids, *pipe.execute())
+
+
+async def _apending(key, ids):
+    ids = list(ids)
+    if not ids:
+        return {}
+
+    pipe = get_connection().pipeline(transaction=False)
+    pipe.hmget(key, ids)
+    pipe.hmget(key + FLUSHING_SUFFIX, ids)
+    return _sum_pending(ids, *await pipe.execute())
+
+
+def _sum_pending(ids, live, flushing):
+    return {id: int(a or 0) + int(b or 0) for id, a, b in zip(ids, live, flushing)}
+
+
+def pending_novel_views(ids):
+    """
+    Return views buffered for the given novels that are not flushed yet.
+
+    Args:
+        ids (iterable): Novel ids.
+
+    Returns:
+        dict: Mapping of novel id to the number of unflushed views.
+    """
+    return _pending(NOVEL_VIEWS_KEY, ids)
+
+
+async def apending_novel_views(ids):
+    return await _apending(NOVEL_VIEWS_KEY, ids)
+
+
+def pending_chapter_views(ids):
+    """
+    Return views buffered for the given chapters that are not flushed yet.
+
+    Args:
+        ids (iterable): Chapter ids.
+
+    Returns:
+        dict: Mapping of chapter id to the number of unflushed views.
+    """
+    return _pending(CHAPTER_VIEWS_KEY, ids)
+
+
+async def apending_chapter_views(ids):
+    return await _apending(CHAPTER_VIEWS_KEY, ids)
+
+
+def _apply(model, counts, batch_size):
+    # Group rows by increment so each distinct n costs a single
+    # UPDATE ... SET views = views + n WHERE id IN (...).
+    by_increment = defaultdict(list)
+    for id, n in counts.items():
+        by_increment[n].append(id)
+
+    for n, ids in by_increment.items():
+        for i in range(0, len(ids), batch_size):
+            model.objects.filter(pk__in=ids[i : i + batch_size]).update(
+                views=F("views") + n
+            )
+
+
+def _bump_authors(chapters, batch_size):
+    # Chapter views also count towards their author's total_views.
+    authors = defaultdict(int)
+    ids = list(chapters)
+    for i in range(0, len(ids), batch_size):
+        for id, user_id in Chapter.objects.filter(
+            pk__in=ids[i : i + batch_size]
+        ).values_list("id", "novel__user_id"):
+            if user_id:
+                authors[user_id] += chapters[id]
+    for user_id, n in authors.items():
+        bump_author_stats(user_id, total_views=n)
+
+
+def _flush_key(key, model, batch_size, also=None):
+    """
+    Apply the buffered counts of one hash to ``model``.
+
+    Args:
+        also (callable): Called with (counts, batch_size) in the same
+            transaction, for writes that must not be applied without the
+            counts or twice.
+    """
+    redis = get_redis_connection("default")
+    flushing = key + FLUSHING_SUFFIX
+
+    # A leftover flushing hash means the previous run died before it
+    # committed; retry it before taking the next batch.
+    if not redis.exists(flushing):
+        try:
+            redis.rename(key, flushing)
+        except ResponseError:
+            # Nothing buffered since the last flush.
+            return {}
+
+    counts = {int(id): int(n) for id, n in redis.hgetall(flushing).items() if int(n)}
+    with transaction.atomic():
+        _apply(model, counts, batch_size)
+        if also is not None:
+            also(counts, batch_size)
+        # Dropped before committing: if the commit then fails the batch is
+        # lost, which is better than applying it twice on the next run.
+        redis.delete(flushing)
+
+    return counts
+
+
+def flush_views(batch_size=500):
+    """
+    Move buffered view counts into the database.
+
+    Args:
+        batch_size (int): Maximum number of ids per UPDATE statement.
+
+    Returns:
+        tuple: (novel_counts, chapter_counts) dicts of the flushed increments.
+    """
+    novels = _flush_key(NOVEL_VIEWS_KEY, Novel, batch_size)
+    chapters = _flush_key(CHAPTER_VIEWS_KEY, Chapter, batch_size, also=_bump_authors)
+
+    if novels:
+        refresh_if_ranking_changed()
+
+    return novels, chapters
@@ -0,0 +1,242 @@
+"""
+EPUB import.
+
+``EpubBook`` reads an EPUB straight from its zip archive instead of loading
+it whole with ebooklib: only the package document (metadata, manifest,
+spine) and the table of contents are parsed when the book is opened, and
+``chapters`` then reads the spine documents one at a time, so a large book
+never sits in memory at once.
+
+Each spine document becomes a chapter titled from the TOC (EPUB 3 nav or
+EPUB 2 NCX), falling back to its own heading. Documents the TOC does not
+point to are continuations of the previous chapter (books often split long
+chapters over several files) and are appended to it; documents without
+text, such as a cover page, are skipped.
+"""
+
+import posixpath
+import zipfile
+from urllib.parse import unquote, urldefrag
+from xml.etree import ElementTree
+
+from bs4 import BeautifulSoup
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from novel.ingest import MAX_CHAPTER_BYTES, IngestError
+from novel.models import Novel
+from novel.normalize import normalize_content
+
+NS = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "ncx": "http://www.daisy.org/z3986/2005/ncx/",
+}
+
+MAX_COVER_BYTES = 10 * 1024 * 1024
+
+
+def is_epub(fileobj):
+    """
+    Return whether a seekable binary file is an EPUB; leaves it rewound.
+    """
+    try:
+        with zipfile.ZipFile(fileobj) as archive:
+            names = archive.namelist()
+            return "META-INF/container.xml" in names and (
+                "mimetype" not in names
+                or archive.read("mimetype").strip() == b"application/epub+zip"
+            )
+    except zipfile.BadZipFile:
+        return False
+    finally:
+        fileobj.seek(0)
+
+
+class EpubBook:
+    """
+    An EPUB opened for reading.
+
+    Raises:
+        IngestError: If the file is not a readable EPUB.
+    """
+
+    def __init__(self, fileobj):
+        try:
+            self.archive = zipfile.ZipFile(fileobj)
+            container = self._xml("META-INF/container.xml")
+            path = container.find(".//container:rootfile", NS).get("full-path")
+            package = self._xml(path)
+        except (zipfile.BadZipFile, KeyError, AttributeError, ElementTree.ParseError):
+            raise IngestError("Not a valid EPUB file")
+
+        self.root = posixpath.dirname(path)
+        self.title = self._text(package, "opf:metadata/dc:title")
+        self.creator = self._text(package, "opf:metadata/dc:creator")
+        self.description = self._text(package, "opf:metadata/dc:description")
+
+        # id -> (archive path, media type, properties)
+        self.manifest = {
+            item.get("id"): (
+                self._path(self.root, item.get("href", "")),
+                item.get("media-type", ""),
+                item.get("properties", "").split(),
+            )
+            for item in package.iterfind("opf:manifest/opf:item", NS)
+        }
+        spine = package.find("opf:spine", NS)
+        self.spine = []
+        for itemref in spine.iterfind("opf:itemref", NS) if spine is not None else ():
+            item = self.manifest.get(itemref.get("idref"))
+            # The TOC page is navigation, not part of the story.
+            if item and itemref.get("linear") != "no" and "nav" not in item[2]:
+                self.spine.append(item[0])
+        self.titles = self._toc(spine)
+        self.cover_path = self._cover(package)
+
+    def close(self):
+        self.archive.close()
+
+    @staticmethod
+    def _path(base, href):
+        return posixpath.normpath(posixpath.join(base, unquote(urldefrag(href)[0])))
+
+    @staticmethod
+    def _text(element, path):
+        found = element.find(path, NS)
+        return (found.text or "").strip() if found is not None else ""
+
+    def _read(self, name, limit=MAX_CHAPTER_BYTES):
+        with self.archive.open(name) as file:
+            # Don't trust the size in the zip header.
+            data = file.read(limit + 1)
+        if len(data) > limit:
+            raise IngestError(f"{name} is too large")
+        return data
+
+    def _xml(self, name):
+        return ElementTree.fromstring(self._read(name))
+
+    def _toc(self, spine):
+        """
+        Return {archive path: title} from the EPUB 3 nav or EPUB 2 NCX.
+        """
+        titles = {}
+        nav = next(
+            (path for path, _, props in self.manifest.values() if "nav" in props),
+            None,
+        )
+        ncx = self.manifest.get(spine.get("toc") if spine is not None else None)
+        try:
+            if nav:
+                soup = BeautifulSoup(self._read(nav), "html.parser")
+                toc = soup.find("nav", attrs={"epub:type": "toc"}) or soup.find("nav")
+                for link in toc.find_all("a", href=True) if toc else ():
+                    path = self._path(posixpath.dirname(nav), link["href"])
+                    titles.setdefault(path, link.get_text(" ", strip=True))
+            elif ncx:
+                base = posixpath.dirname(ncx[0])
+                for point in self._xml(ncx[0]).iter(f"{{{NS['ncx']}}}navPoint"):
+                    label = point.find("ncx:navLabel/ncx:text", NS)
+                    content = point.find("ncx:content", NS)
+                    if label is not None and content is not None:
+                        path = self._path(base, content.get("src", ""))
+                        titles.setdefault(path, (label.text or "").strip())
+        except (KeyError, ElementTree.ParseError):
+            # A broken TOC only costs us the titles.
+            pass
+        return titles
+
+    def _cover(self, package):
+        images = {
+            id: path
+            for id, (path, media_type, _) in self.manifest.items()
+            if media_type.startswith("image/")
+        }
+        for path, _, props in self.manifest.values():
+            if "cover-image" in props:
+                return path
+        meta = package.find("opf:metadata/opf:meta[@name='cover']", NS)
+        if meta is not None and meta.get("content") in images:
+            return images[meta.get("content")]
+        for id, path in images.items():
+            if "cover" in id.lower() or "cover" in path.lower():
+                return path
+        return None
+
+    def cover(self):
+        """
+        Return the cover image as a ContentFile, or None.
+        """
+        if not self.cover_path:
+            return None
+        try:
+            data = self._read(self.cover_path, MAX_COVER_BYTES)
+        except KeyError:
+            return None
+        return ContentFile(data, name=posixpath.basename(self.cover_path))
+
+    def chapters(self):
+        """
+        Yield (title, html) for every chapter, in spine order.
+        """
+        pending = None
+        for path in self.spine:
+            try:
+                soup = BeautifulSoup(self._read(path), "html.parser")
+            except KeyError:
+                continue
+            body = soup.body or soup
+            if not body.get_text(strip=True):
+                continue
+
+            content = body.decode_contents()
+            if pending and self.titles and path not in self.titles:
+                pending = (pending[0], pending[1] + content)
+                continue
+
+            if pending:
+                yield pending
+            heading = soup.find(["h1", "h2", "h3"]) or soup.title
+            title = self.titles.get(path) or (
+                heading.get_text(" ", strip=True) if heading else ""
+            )
+            pending = (title or posixpath.basename(path), content)
+
+        if pending:
+            yield pending
+
+
+def novel_from_book(book, user):
+    """
+    Create a Novel from an EPUB's metadata and cover.
+
+    The cover is stored once the current transaction commits, so a failed
+    import leaves no file behind.
+
+    Raises:
+        IngestError: If the book has no title or the title is taken.
+    """
+    if not book.title:
+        raise IngestError("The EPUB has no title")
+    if Novel.objects.filter(title=book.title).exists():
+        raise IngestError(f"A novel titled {book.title!r} already exists")
+
+    novel = Novel(
+        title=book.title,
+        # Untrusted markup; the novel page renders it unescaped.
+        description=normalize_content(book.description),
+        user=user,
+    )
+    if book.creator:
+        novel.creator = book.creator[:50]
+    novel.save()
+
+    cover = book.cover()
+    if cover:
+        # A missing cover is not worth failing a committed import over.
+        transaction.on_commit(
+            lambda: novel.novel_image.save(cover.name, cover), robust=True
+        )
+    return novel
@@ -0,0 +1,94 @@
+from django import forms
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from novel.compression import compress, decompress
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Decompress the stored bytes on first attribute access rather than when
+    the row is loaded, so rows that are listed, cached or copied but never
+    rendered are never inflated.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = instance.__dict__[self.field.attname] = decompress(value)
+        if value is None and self.field.fallback:
+            return getattr(instance, self.field.fallback)
+        return value
+
+    def __set__(self, instance, value):
+        # A data descriptor, so reads always go through __get__ even though
+        # the value lives in the instance __dict__.
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    A text field stored compressed (see ``novel.compression``).
+
+    Assign and read ``str`` values as with a TextField. ``fallback`` names
+    another attribute to read while the column is NULL, e.g. a legacy
+    uncompressed column that has not been converted yet.
+    """
+
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, fallback=None, **kwargs):
+        self.fallback = fallback
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.pop("editable", None)
+        if not self.editable:
+            kwargs["editable"] = False
+        if self.fallback:
+            kwargs["fallback"] = self.fallback
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return bytes(value) if value is not None else None
+
+    def to_python(self, value):
+        return value
+
+    def get_prep_value(self, value):
+        if isinstance(value, str):
+            return compress(value)
+        if isinstance(value, memoryview):
+            return bytes(value)
+        return value
+
+    def compressed(self, instance):
+        """
+        Return the stored form of the value on ``instance``, compressing it
+        only if it was assigned or decompressed since it was loaded.
+        """
+        value = instance.__dict__.get(self.attname)
+        if value is None:
+            value = getattr(instance, self.attname)
+        return self.get_prep_value(value)
+
+    def pre_save(self, model_instance, add):
+        # Untouched content is saved as the stored bytes, not decompressed
+        # and compressed again.
+        return self.compressed(model_instance)
+
+    def value_from_object(self, obj):
+        return getattr(obj, self.attname)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        # Skip BinaryField's base64 handling; the form edits plain text.
+        return models.Field.formfield(
+            self, **{"form_class": forms.CharField, "widget": forms.Textarea, **kwargs}
+        )
@@ -64,3 +64,33 @@ class NewChapterForm(forms.Form):
         label="Chapter Content (Required)",
         widget=forms.Textarea(attrs={"class": "form-control", "rows": 50}),
     )
+
+
+class UploadChaptersForm(forms.Form):
+    file = forms.FileField(
+        label="Chapters (Required)",
+        help_text=(
+            "An EPUB, a .zip of .txt, .md or .html files (one chapter each), or "
+            "one text file with a '# Title' line before every chapter."
+        ),
+        widget=forms.FileInput(attrs={"class": "form-control"}),
+    )
+    start = forms.IntegerField(
+        label="First Chapter Number",
+        help_text="Defaults to the number after the last chapter.",
+        required=False,
+        widget=forms.NumberInput(attrs={"class": "form-control"}),
+    )
+
+
+class ImportEpubForm(forms.Form):
+    file = forms.FileField(
+        label="EPUB (Required)",
+        help_text="Title, description, cover and chapters are read from the book.",
+        widget=forms.FileInput(attrs={"class": "form-control", "accept": ".epub"}),
+    )
+    genres = forms.MultipleChoiceField(
+        choices=NewNovelForm.base_fields["genres"].choices,
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+    )
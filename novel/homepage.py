@@ -0,0 +1,195 @@
+"""
+Homepage snapshot.
+
+The homepage lists are assembled into one user-agnostic payload stored
+under a single cache key, so a request does one cache read and only adds
+the per-user ``is_author`` flags. The snapshot is rebuilt in a background
+thread when a novel or chapter is created or removed, and when a rating or
+comment changes the averages or counts it shows (see ``novel.signals``),
+and by the view-counter flush when the popularity ranking changes.
+"""
+
+import threading
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from novel.caching import cached, read, store
+from novel.models import Chapter, Comment, Novel
+from novel.serializers import serialize_novels
+
+SNAPSHOT_KEY = "homepage"
+VERSION_KEY = "homepage_version"
+
+LATEST_NOVELS = 9
+POPULAR_NOVELS = 9
+LATEST_CHAPTERS = 10
+
+_lock = threading.Lock()
+_dirty = False
+_running = False
+
+
+def _popular_ids():
+    return list(
+        Novel.objects.order_by("-views", "-id").values_list("id", flat=True)[
+            :POPULAR_NOVELS
+        ]
+    )
+
+
+def _latest_chapters():
+    chapters = (
+        Chapter.objects.select_related("novel")
+        .defer(
+            "content",
+            "content_text",
+            "novel__description",
+            "novel__search_vector",
+        )
+        .annotate(
+            comments_count=Coalesce(
+                Subquery(
+                    Comment.objects.filter(chapter=OuterRef("pk"))
+                    .order_by()
+                    .values("chapter")
+                    .annotate(count=Count("pk"))
+                    .values("count")[:1]
+                ),
+                0,
+            )
+        )
+        .order_by("-id")[:LATEST_CHAPTERS]
+    )
+    return [
+        {
+            "id": chapter.id,
+            "novel_name": chapter.novel.title,
+            "novel_image_url": (
+                chapter.novel.novel_image.url if chapter.novel.novel_image else None
+            ),
+            "title": chapter.title,
+            "num": chapter.num,
+            "date": chapter.date,
+            "views": chapter.views,
+            "comments": chapter.comments_count,
+        }
+        for chapter in chapters
+    ]
+
+
+def build_snapshot():
+    """
+    Assemble the homepage payload from the database.
+
+    Returns:
+        dict: ``latest``, ``popular`` and ``chapters`` lists serialized for an
+        anonymous user, plus ``authors`` mapping novel ids to author ids for
+        ``personalize``.
+    """
+    anonymous = AnonymousUser()
+    latest = Novel.objects.order_by("-date", "-id")[:LATEST_NOVELS]
+    popular_ids = _popular_ids()
+
+    snapshot = {
+        "latest": serialize_novels(latest, anonymous),
+        "popular": serialize_novels(popular_ids, anonymous),
+        "popular_ids": popular_ids,
+        "chapters": _latest_chapters(),
+        "built": time.time(),
+    }
+    ids = {novel["id"] for novel in snapshot["latest"] + snapshot["popular"]}
+    snapshot["authors"] = dict(
+        Novel.objects.filter(pk__in=ids).values_list("id", "user_id")
+    )
+    return snapshot
+
+
+def _versioned_snapshot():
+    snapshot = build_snapshot()
+    cache.add(VERSION_KEY, 0, None)
+    snapshot["version"] = cache.incr(VERSION_KEY)
+    return snapshot
+
+
+def rebuild_snapshot():
+    return store(SNAPSHOT_KEY, _versioned_snapshot())
+
+
+def get_snapshot():
+    return cached(SNAPSHOT_KEY, _versioned_snapshot, None)
+
+
+def personalize(snapshot, user):
+    """
+    Return the snapshot lists with ``is_author`` set for ``user``.
+    """
+    authors = snapshot["authors"]
+
+    def flag(novels):
+        return [
+            {
+                **novel,
+                "is_author": user.is_authenticated
+                and authors.get(novel["id"]) == user.id,
+            }
+            for novel in novels
+        ]
+
+    return {
+        "latest": flag(snapshot["latest"]),
+        "popular": flag(snapshot["popular"]),
+        "chapters": snapshot["chapters"],
+        "version": snapshot["version"],
+    }
+
+
+def _run():
+    global _dirty, _running
+    try:
+        while True:
+            with _lock:
+                if not _dirty:
+                    _running = False
+                    return
+                _dirty = False
+            try:
+                rebuild_snapshot()
+            except Exception:
+                # Keep serving the previous snapshot; the next change retries.
+                pass
+    finally:
+        connection.close()
+
+
+def _start():
+    global _dirty, _running
+    with _lock:
+        # Changes arriving while a rebuild runs are folded into one more pass.
+        _dirty = True
+        if _running:
+            return
+        _running = True
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def schedule_rebuild():
+    """
+    Rebuild the snapshot in a background thread once the current
+    transaction commits.
+    """
+    transaction.on_commit(_start)
+
+
+def refresh_if_ranking_changed():
+    """
+    Rebuild the snapshot if the most viewed novels are no longer the ones
+    it lists.
+    """
+    snapshot = read(SNAPSHOT_KEY)
+    if snapshot is None or snapshot["popular_ids"] != _popular_ids():
+        rebuild_snapshot()
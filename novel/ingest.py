@@ -0,0 +1,214 @@
+"""
+Bulk chapter ingest.
+
+``parse_upload`` reads chapters lazily from either
+
+* a zip of ``.txt``/``.md``/``.html`` files, one chapter per file in
+  (natural) file name order, titled by a leading ``# Heading`` line or else
+  by the file name; or
+* one text file in which every chapter starts with a ``# Title`` line; or
+* an EPUB (see ``novel.epub``),
+
+and ``ingest_chapters`` inserts them with ``bulk_create`` in batches inside
+a single transaction. ``bulk_create`` sends no signals, so everything the
+Chapter signal handlers would do (normalization, compression, TOC patch,
+cache invalidation, homepage rebuild) is done here once per batch instead
+of once per chapter.
+"""
+
+import html
+import os
+import re
+import zipfile
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Max
+
+from novel import homepage, toc
+from novel.books import book_tag
+from novel.caching import invalidate
+from novel.compression import active_dictionary, compress
+from novel.models import Chapter
+from novel.normalize import VERSION, normalize_content
+
+BATCH_SIZE = 100
+MAX_CHAPTERS = 5000
+MAX_CHAPTER_BYTES = 2 * 1024 * 1024
+
+TEXT_EXTENSIONS = [".txt", ".md", ".markdown"]
+HTML_EXTENSIONS = [".html", ".htm", ".xhtml"]
+
+HEADING = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$")
+
+
+class IngestError(Exception):
+    pass
+
+
+def _natural(name):
+    # "2.txt" sorts before "10.txt".
+    return [
+        int(part) if part.isdigit() else part.lower()
+        for part in re.split(r"(\d+)", name)
+    ]
+
+
+def _paragraphs(lines):
+    return "".join(f"<p>{html.escape(line, quote=False)}</p>" for line in lines)
+
+
+def _text_chapter(text, title):
+    lines = text.splitlines()
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    match = HEADING.match(lines[0]) if lines else None
+    if match:
+        title = match[1]
+        lines.pop(0)
+    return title, _paragraphs(lines)
+
+
+def _parse_zip(fileobj):
+    with zipfile.ZipFile(fileobj) as archive:
+        members = sorted(
+            (
+                member
+                for member in archive.infolist()
+                if not member.is_dir()
+                and os.path.splitext(member.filename)[1].lower()
+                in TEXT_EXTENSIONS + HTML_EXTENSIONS
+            ),
+            key=lambda member: _natural(member.filename),
+        )
+        for member in members:
+            name, extension = os.path.splitext(os.path.basename(member.filename))
+            with archive.open(member) as file:
+                # Don't trust the size in the zip header.
+                data = file.read(MAX_CHAPTER_BYTES + 1)
+            if len(data) > MAX_CHAPTER_BYTES:
+                raise IngestError(f"{member.filename} is too large")
+
+            text = data.decode("utf-8-sig", errors="replace")
+            if extension.lower() in HTML_EXTENSIONS:
+                yield name, text
+            else:
+                yield _text_chapter(text, name)
+
+
+def _parse_delimited(fileobj, name):
+    title = None
+    lines = []
+    size = 0
+    for i, raw in enumerate(fileobj):
+        line = raw.decode("utf-8-sig" if i == 0 else "utf-8", errors="replace")
+        line = line.rstrip("\r\n")
+        match = HEADING.match(line)
+        if match:
+            if title is not None or any(map(str.strip, lines)):
+                yield title or name, _paragraphs(lines)
+            title = match[1]
+            lines = []
+            size = 0
+            continue
+
+        lines.append(line)
+        size += len(raw)
+        if size > MAX_CHAPTER_BYTES:
+            raise IngestError(f"Chapter {title or name!r} is too large")
+
+    if title is not None or any(map(str.strip, lines)):
+        yield title or name, _paragraphs(lines)
+
+
+def _parse_epub(fileobj):
+    # novel.epub builds on this module.
+    from novel.epub import EpubBook
+
+    book = EpubBook(fileobj)
+    try:
+        yield from book.chapters()
+    finally:
+        book.close()
+
+
+def parse_upload(fileobj, name=""):
+    """
+    Yield (title, html) for every chapter in an uploaded file.
+
+    Args:
+        fileobj: A binary file object (seekable), e.g. an UploadedFile.
+        name (str): The file's name, used as the title of text that comes
+            before the first heading.
+
+    Raises:
+        IngestError: If a chapter is too large or an EPUB is unreadable.
+    """
+    from novel.epub import is_epub
+
+    if is_epub(fileobj):
+        return _parse_epub(fileobj)
+    is_zip = zipfile.is_zipfile(fileobj)
+    fileobj.seek(0)
+    if is_zip:
+        return _parse_zip(fileobj)
+    return _parse_delimited(fileobj, os.path.splitext(os.path.basename(name))[0])
+
+
+def _after_batch(novel_id, chapters):
+    # What the chapter_saved handler would have done for each chapter.
+    transaction.on_commit(lambda: toc.save_chapters(chapters))
+    invalidate(f"novel:{novel_id}", book_tag(novel_id))
+
+
+def ingest_chapters(novel, chapters, start=None, batch_size=BATCH_SIZE):
+    """
+    Insert ``chapters`` into ``novel`` as consecutive chapter numbers.
+
+    A generator: it yields the running number of created chapters after
+    each batch and must be consumed to the end; the whole upload is one
+    transaction, rolled back if parsing fails or the generator is closed
+    early.
+
+    Args:
+        novel (Novel): The novel to add to.
+        chapters: Iterable of (title, html), e.g. from ``parse_upload``.
+        start (int): Number of the first chapter; defaults to one past the
+            novel's last chapter.
+        batch_size (int): Chapters per INSERT.
+
+    Raises:
+        IngestError: If there is nothing to add or more than
+            ``MAX_CHAPTERS`` chapters.
+    """
+    dictionary = active_dictionary()
+    chapters = iter(chapters)
+    created = 0
+
+    with transaction.atomic():
+        if start is None:
+            last = novel.chapters.aggregate(last=Max("num"))["last"]
+            start = (last or 0) + 1
+
+        while batch := list(islice(chapters, batch_size)):
+            if created + len(batch) > MAX_CHAPTERS:
+                raise IngestError(f"More than {MAX_CHAPTERS} chapters")
+
+            rows = [
+                Chapter(
+                    novel=novel,
+                    num=start + created + i,
+                    title=title,
+                    content=compress(normalize_content(content), dictionary),
+                    content_version=VERSION,
+                )
+                for i, (title, content) in enumerate(batch)
+            ]
+            Chapter.objects.bulk_create(rows)
+            _after_batch(novel.id, rows)
+            created += len(rows)
+            yield created
+
+        if not created:
+            raise IngestError("No chapters found")
+        homepage.schedule_rebuild()
@@ -0,0 +1,193 @@
+"""
+Per-process cache tier in front of Redis.
+
+``novel.caching.cached`` looks entries up here before going to Redis. The
+tier is an LRU bounded by the pickled size of its values (``MAX_BYTES``),
+and entries also expire after ``TTL`` seconds as a safety net.
+
+Invalidation crosses workers over Redis pub/sub: ``publish`` announces
+bumped tags and rewritten keys on ``CHANNEL``, and a listener thread in
+every process evicts the matching local entries. Until the listener is
+subscribed (and whenever it loses its connection) the tier stays empty, so
+it never serves something it could have missed an invalidation for.
+
+Hits per tier are counted in memory and added to the ``STATS_KEY`` hash
+every ``STATS_INTERVAL`` seconds; ``manage.py cache_stats`` reports them.
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django_redis import get_redis_connection
+
+MAX_BYTES = 32 * 1024 * 1024
+TTL = 30
+
+CHANNEL = "genesis:cache:invalidate"
+RECONNECT_DELAY = 1
+
+STATS_KEY = "genesis:cache:stats"
+STATS_INTERVAL = 10
+TIERS = ["local", "redis", "miss"]
+
+
+class LocalCache:
+    def __init__(self, max_bytes=MAX_BYTES, ttl=TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (value, size, expires, tags)
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        self.pid = None
+        self.listening = False
+        # Bumped on every eviction; see set().
+        self.generation = 0
+
+    def _pop(self, key):
+        item = self.entries.pop(key, None)
+        if item is None:
+            return
+        self.size -= item[1]
+        for tag in item[3]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def get(self, key):
+        self.listen()
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            if item[2] < time.monotonic():
+                self._pop(key)
+                return None
+            self.entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, tags=(), generation=None, size=None):
+        """
+        Keep ``value`` locally. Values are shared between requests and must
+        be treated as read-only.
+
+        Args:
+            generation (int): ``self.generation`` from before ``value`` was
+                read from Redis or built. If anything was evicted since, the
+                value may predate that invalidation and is not kept.
+            size (int): The value's serialized size if already known, e.g.
+                as read from Redis; saves pickling it again to measure it.
+        """
+        if not self.listening:
+            return
+        if size is None:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._pop(key)
+            self.entries[key] = (value, size, time.monotonic() + self.ttl, tuple(tags))
+            self.size += size
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+
+    def evict(self, keys=(), tags=()):
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self.tags.get(tag, ())):
+                    self._pop(key)
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.tags.clear()
+            self.size = 0
+
+    def listen(self):
+        # Threads don't survive a fork, so check the pid rather than a flag.
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.listening = False
+        self.clear()
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = get_redis_connection("default").pubsub()
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        self.listening = True
+                    elif message["type"] == "message":
+                        kind, _, name = message["data"].decode().partition(":")
+                        if kind == "key":
+                            self.evict(keys=[name])
+                        else:
+                            self.evict(tags=[name])
+            except Exception:
+                pass
+            # Invalidations may have been missed while disconnected.
+            self.listening = False
+            self.clear()
+            time.sleep(RECONNECT_DELAY)
+
+
+local = LocalCache()
+
+
+def publish(keys=(), tags=()):
+    """
+    Evict ``keys`` and entries depending on ``tags`` in every process.
+    """
+    local.evict(keys, tags)
+    redis = get_redis_connection("default")
+    pipeline = redis.pipeline()
+    for key in keys:
+        pipeline.publish(CHANNEL, f"key:{key}")
+    for tag in tags:
+        pipeline.publish(CHANNEL, f"tag:{tag}")
+    pipeline.execute()
+
+
+_counts = dict.fromkeys(TIERS, 0)
+_counted_at = time.monotonic()
+
+
+def count(tier):
+    """
+    Record a lookup answered by ``tier`` ("local", "redis" or "miss").
+    """
+    global _counted_at
+    _counts[tier] += 1
+    if time.monotonic() - _counted_at < STATS_INTERVAL:
+        return
+
+    _counted_at = time.monotonic()
+    counts = {tier: _counts[tier] for tier in TIERS}
+    for tier in TIERS:
+        _counts[tier] -= counts[tier]
+    pipeline = get_redis_connection("default").pipeline()
+    for tier, n in counts.items():
+        if n:
+            pipeline.hincrby(STATS_KEY, tier, n)
+    pipeline.execute()
@@ -0,0 +1,70 @@
+import pickle
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from novel.models import Chapter, Novel
+from novel.records import CHAPTER_FIELDS, NOVEL_FIELDS, pack, unpack
+from novel.toc import TableOfContents
+
+
+class Command(BaseCommand):
+    help = "Compare pickled model instances with compact cache records"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=100)
+
+    def measure(self, label, values, decode):
+        # django_redis pickles with the highest protocol by default.
+        blobs = [pickle.dumps(value, pickle.HIGHEST_PROTOCOL) for value in values]
+        size = sum(len(blob) for blob in blobs) / max(len(blobs), 1)
+
+        start = perf_counter()
+        for _ in range(self.repeat):
+            for blob in blobs:
+                decode(pickle.loads(blob))
+        elapsed = (perf_counter() - start) / max(self.repeat * len(blobs), 1)
+
+        self.stdout.write(
+            f"{label:<28} {size:10.0f} bytes/key {elapsed * 1e6:10.1f} us/decode"
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        count = options["count"]
+
+        novels = list(Novel.objects.order_by("id")[:count])
+        chapters = list(Chapter.objects.order_by("id")[:count])
+        if not novels:
+            self.stdout.write(self.style.WARNING("No novels to measure"))
+            return
+
+        self.stdout.write(f"{len(novels)} novels, {len(chapters)} chapters")
+        self.measure("novel instance", novels, lambda value: value)
+        self.measure(
+            "novel record",
+            [pack(novel, NOVEL_FIELDS) for novel in novels],
+            lambda value: unpack(Novel, NOVEL_FIELDS, value),
+        )
+        if chapters:
+            self.measure("chapter instance", chapters, lambda value: value)
+            self.measure(
+                "chapter record",
+                [pack(chapter, CHAPTER_FIELDS) for chapter in chapters],
+                lambda value: unpack(Chapter, CHAPTER_FIELDS, value),
+            )
+
+        # The per-novel chapter list used to be an evaluated queryset with
+        # every chapter's content; it is now the table of contents.
+        ids = [novel.id for novel in novels[:10]]
+        self.measure(
+            "chapter list queryset",
+            [list(Chapter.objects.filter(novel_id=id)) for id in ids],
+            lambda value: value[:20],
+        )
+        self.measure(
+            "table of contents",
+            [TableOfContents.build(id) for id in ids],
+            lambda value: value[:20],
+        )
@@ -0,0 +1,93 @@
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from novel.models import Novel
+from novel.serializers import serialize_novels
+
+
+def legacy_serialize(novel, user):
+    # The per-instance Novel.serialize this engine replaced, kept here as
+    # the benchmark baseline.
+    return {
+        "id": novel.id,
+        "title": novel.title,
+        "description": novel.description,
+        "image": (
+            novel.novel_image.url if novel.novel_image else "/media/placeholder.png"
+        ),
+        "comments": novel.novel_comments.count(),
+        "total_comments": novel.novel_comments.count()
+        + sum(chapter.chapter_comments.count() for chapter in novel.chapters.all()),
+        "views": novel.views,
+        "latest_chapter": (
+            novel.chapters.order_by("-num").first().num
+            if novel.chapters.exists()
+            else None
+        ),
+        "tags": [tag.name for tag in novel.tags.all()],
+        "genres": [genre.name for genre in novel.genres.all()],
+        "average_rating": (
+            round(
+                sum(rating.average_rating for rating in novel.novel_ratings.all())
+                / novel.novel_ratings.count(),
+                1,
+            )
+            if novel.novel_ratings.exists()
+            else None
+        ),
+        "status": novel.status,
+        "num": novel.chapters.count(),
+        "date": novel.date,
+        "author": novel.user.username if novel.user else "Unknown",
+        "is_author": novel.user == user,
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare per-instance and batch novel serialization"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+
+    def measure(self, function):
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            result = function()
+            elapsed = perf_counter() - start
+        return result, elapsed, len(queries.captured_queries)
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+
+        for size in options["sizes"]:
+            ids = list(Novel.objects.order_by("id").values_list("id", flat=True)[:size])
+            if len(ids) < size:
+                self.stdout.write(
+                    self.style.WARNING(f"Only {len(ids)} novels available for N={size}")
+                )
+
+            legacy, legacy_time, legacy_queries = self.measure(
+                lambda: [
+                    legacy_serialize(novel, user)
+                    for novel in Novel.objects.filter(pk__in=ids).order_by("id")
+                ]
+            )
+            batch, batch_time, batch_queries = self.measure(
+                lambda: serialize_novels(
+                    Novel.objects.filter(pk__in=ids).order_by("id"), user
+                )
+            )
+
+            if legacy != batch:
+                self.stdout.write(self.style.ERROR(f"N={size}: outputs differ"))
+
+            self.stdout.write(
+                f"N={len(ids):>5}  "
+                f"legacy {legacy_time * 1000:9.1f} ms {legacy_queries:6d} queries  "
+                f"batch {batch_time * 1000:9.1f} ms {batch_queries:6d} queries  "
+                f"speedup {legacy_time / batch_time if batch_time else 0:6.1f}x"
+            )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from novel.localcache import STATS_KEY, TIERS
+
+
+class Command(BaseCommand):
+    help = "Show cache hit rates per tier (local memory, Redis, miss)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Clear the counters after printing"
+        )
+
+    def handle(self, *args, **options):
+        redis = get_redis_connection("default")
+        counts = {tier.decode(): int(n) for tier, n in redis.hgetall(STATS_KEY).items()}
+        counts = {tier: counts.get(tier, 0) for tier in TIERS}
+        total = sum(counts.values())
+
+        if not total:
+            self.stdout.write("No cache lookups recorded yet")
+            return
+
+        remote = counts["redis"] + counts["miss"]
+        self.stdout.write(f"{total} lookups")
+        self.stdout.write(
+            f"local  {counts['local']:>10}  {counts['local'] / total:7.1%} of lookups"
+        )
+        self.stdout.write(
+            f"redis  {counts['redis']:>10}  "
+            f"{counts['redis'] / remote if remote else 0:7.1%} of local misses"
+        )
+        self.stdout.write(f"miss   {counts['miss']:>10}  {counts['miss'] / total:7.1%}")
+
+        if options["reset"]:
+            redis.delete(STATS_KEY)
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from novel.compression import active_dictionary, compress, dictionary_id
+from novel.models import Chapter
+
+
+class Command(BaseCommand):
+    help = "Move chapter content into compressed storage in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--recompress",
+            action="store_true",
+            help="Also re-encode chapters not using the newest dictionary",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        dictionary = active_dictionary()
+        chapters = Chapter.objects.all()
+        if not options["recompress"]:
+            chapters = chapters.filter(content__isnull=True)
+
+        last_id = 0
+        converted = 0
+        before = after = 0
+
+        while True:
+            with transaction.atomic():
+                # Locked until written back, so an edit can't be overwritten
+                # by the content read here.
+                batch = list(
+                    chapters.select_for_update()
+                    .filter(pk__gt=last_id)
+                    .only("id", "content", "content_text")
+                    .order_by("pk")[:chunk_size]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].pk
+
+                changed = []
+                for chapter in batch:
+                    stored = chapter.__dict__["content"]
+                    if stored is not None and dictionary_id(stored) == dictionary[0]:
+                        continue
+                    text = chapter.content
+                    compressed = compress(text, dictionary)
+                    before += len(stored) if stored is not None else len(text.encode())
+                    after += len(compressed)
+                    chapter.content = compressed
+                    chapter.content_text = ""
+                    changed.append(chapter)
+
+                Chapter.objects.bulk_update(changed, ["content", "content_text"])
+            converted += len(changed)
+            self.stdout.write(f"Compressed {converted} chapters (up to id {last_id})")
+
+        ratio = after / before if before else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compressed {converted} chapters: {before} -> {after} bytes "
+                f"({ratio:.1%})"
+            )
+        )
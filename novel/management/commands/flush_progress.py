@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from novel.progress import flush_progress
+
+
+class Command(BaseCommand):
+    help = "Save buffered reading positions from Redis into ReadingProgress"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        saved = flush_progress(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Saved {saved} reading positions"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from novel.counters import flush_views
+
+
+class Command(BaseCommand):
+    help = "Flush buffered page views from Redis into Novel.views and Chapter.views"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        novels, chapters = flush_views(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Flushed {sum(novels.values())} novel views ({len(novels)} novels) "
+                f"and {sum(chapters.values())} chapter views ({len(chapters)} chapters)"
+            )
+        )
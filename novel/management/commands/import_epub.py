@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from novel.epub import EpubBook, novel_from_book
+from novel.ingest import BATCH_SIZE, IngestError, ingest_chapters
+from novel.models import Genre, User
+
+
+class Command(BaseCommand):
+    help = "Create a novel with its cover and chapters from an EPUB file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--user", required=True, help="Username of the author")
+        parser.add_argument(
+            "--genre", action="append", default=[], help="Genre name; repeatable"
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+        genres = list(Genre.objects.filter(name__in=options["genre"]))
+        if len(genres) != len(set(options["genre"])):
+            raise CommandError("Unknown genre")
+
+        created = 0
+        with open(options["path"], "rb") as file:
+            try:
+                book = EpubBook(file)
+                try:
+                    with transaction.atomic():
+                        novel = novel_from_book(book, user)
+                        novel.genres.set(genres)
+                        for created in ingest_chapters(
+                            novel, book.chapters(), batch_size=options["batch_size"]
+                        ):
+                            self.stdout.write(f"Processed {created} chapters")
+                finally:
+                    book.close()
+            except IngestError as e:
+                raise CommandError(f"{e}; nothing was saved")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {novel.title} with {created} chapters")
+        )
@@ -0,0 +1,100 @@
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from novel.models import Chapter
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure throughput and latency of pages on running servers, e.g. the "
+        "WSGI and ASGI deployments side by side"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "urls", nargs="+", help="Base URLs such as http://127.0.0.1:8000"
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Page to request; repeat for several (default: a chapter and "
+            "its novel)",
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument(
+            "--cookie", help="Cookie header to send, e.g. sessionid=... for a reader"
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or self.default_paths()
+        headers = {"Cookie": options["cookie"]} if options["cookie"] else {}
+
+        for url in options["urls"]:
+            latencies, errors, elapsed = self.run(
+                url, paths, headers, options["requests"], options["concurrency"]
+            )
+            p50, p90, p99 = (
+                statistics.quantiles(latencies, n=100)[i] * 1000 for i in (49, 89, 98)
+            )
+            self.stdout.write(
+                f"{url}: {len(latencies)} requests in {elapsed:.1f}s, "
+                f"{len(latencies) / elapsed:.0f} req/s, p50 {p50:.1f}ms, "
+                f"p90 {p90:.1f}ms, p99 {p99:.1f}ms, {errors} errors"
+            )
+
+    def default_paths(self):
+        chapter = Chapter.objects.order_by("pk").values_list("pk", "novel_id").first()
+        if chapter is None:
+            raise CommandError("No chapters to request; pass --path")
+        return [f"/chapter/{chapter[0]}", f"/novel/{chapter[1]}"]
+
+    def run(self, url, paths, headers, requests, concurrency):
+        """
+        Send ``requests`` GETs cycling through ``paths`` from ``concurrency``
+        keep-alive connections.
+
+        Returns:
+            tuple: (latencies in seconds, error count, elapsed seconds).
+        """
+        url = urlsplit(url)
+        connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        connections = threading.local()
+
+        def fetch(i):
+            path = url.path.rstrip("/") + paths[i % len(paths)]
+            if not hasattr(connections, "connection"):
+                connections.connection = connection_class(url.netloc, timeout=30)
+            start = time.perf_counter()
+            try:
+                connections.connection.request("GET", path, headers=headers)
+                response = connections.connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                connections.connection.close()
+                del connections.connection
+                ok = False
+            return time.perf_counter() - start, ok
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # Warm up caches and connections before measuring.
+            list(pool.map(fetch, range(concurrency)))
+            start = time.perf_counter()
+            results = list(pool.map(fetch, range(requests)))
+            elapsed = time.perf_counter() - start
+
+        latencies = [latency for latency, _ in results]
+        errors = sum(not ok for _, ok in results)
+        return latencies, errors, elapsed
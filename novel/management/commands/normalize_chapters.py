@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from novel.books import book_tag
+from novel.caching import invalidate
+from novel.compression import active_dictionary
+from novel.models import Chapter
+from novel.normalize import VERSION, normalize_rows
+
+
+class Command(BaseCommand):
+    help = "Normalize chapters saved before the current normalization rules"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=100)
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        dictionary = active_dictionary()
+        workers = options["workers"]
+        normalized = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for rows in self.chunks(options["chunk_size"]):
+                # Keep every worker busy without reading the whole corpus
+                # into memory ahead of them.
+                while len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    normalized += self.save(done)
+                pending.add(pool.submit(normalize_rows, rows, dictionary))
+                self.stdout.write(
+                    f"Normalized {normalized} chapters (read up to id {rows[-1][0]})"
+                )
+            normalized += self.save(wait(pending).done)
+
+        self.stdout.write(self.style.SUCCESS(f"Normalized {normalized} chapters"))
+
+    def chunks(self, chunk_size):
+        """
+        Yield lists of (id, content) for stale chapters in id order.
+        """
+        chapters = Chapter.objects.filter(content_version__lt=VERSION)
+        last_id = 0
+        while True:
+            batch = list(
+                chapters.filter(pk__gt=last_id)
+                .only("id", "content", "content_text")
+                .order_by("pk")[:chunk_size]
+            )
+            if not batch:
+                return
+            last_id = batch[-1].pk
+            yield [(chapter.pk, chapter.content) for chapter in batch]
+
+    def save(self, futures):
+        """
+        Write back the results of finished worker batches.
+
+        Returns:
+            int: Number of chapters written.
+        """
+        written = []
+        with transaction.atomic():
+            for future in futures:
+                for id, content in future.result():
+                    # A chapter edited since it was read was normalized by
+                    # the pre_save hook; the result here is out of date.
+                    stale = Chapter.objects.filter(pk=id, content_version__lt=VERSION)
+                    if stale.update(
+                        content=content, content_text="", content_version=VERSION
+                    ):
+                        written.append(id)
+            # update() sends no signals; drop cached chapter records and
+            # the books built from the old content.
+            novels = set(
+                Chapter.objects.filter(pk__in=written).values_list(
+                    "novel_id", flat=True
+                )
+            )
+            invalidate(
+                *[f"chapter:{id}" for id in written],
+                *[book_tag(novel_id) for novel_id in novels],
+            )
+        return len(written)
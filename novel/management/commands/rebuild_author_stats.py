@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from novel.models import User
+from novel.stats import rebuild_author_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute AuthorStats for every user in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        total = 0
+
+        while True:
+            ids = list(
+                User.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+
+            rebuild_author_stats(ids)
+            total += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"Rebuilt {total} users")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {total} users"))
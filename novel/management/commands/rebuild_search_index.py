@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from novel.models import Novel
+from novel.search import search_enabled, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Recompute the full-text search vector of every novel in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError("Full-text search requires PostgreSQL")
+
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        total = 0
+
+        while True:
+            ids = list(
+                Novel.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+
+            update_search_vectors(ids)
+            total += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"Indexed {total} novels")
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} novels"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from novel.models import Comment
+from novel.reactions import reconcile_reactions
+
+
+class Command(BaseCommand):
+    help = "Repair Comment.likes_count / dislikes_count drift from the M2M tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        repaired = 0
+
+        while True:
+            ids = list(
+                Comment.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+
+            repaired += reconcile_reactions(Comment.objects.filter(pk__in=ids))
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} comments"))
@@ -0,0 +1,39 @@
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from novel.compression import DICTIONARY_SIZE, LEVEL, compress, train_dictionary
+from novel.models import Chapter, ContentDictionary
+
+
+class Command(BaseCommand):
+    help = "Train a new shared compression dictionary from sample chapters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=500)
+        parser.add_argument("--size", type=int, default=DICTIONARY_SIZE)
+
+    def handle(self, *args, **options):
+        samples = [
+            chapter.content
+            for chapter in Chapter.objects.only(
+                "id", "content", "content_text"
+            ).order_by("?")[: options["samples"]]
+        ]
+        if not samples:
+            raise CommandError("No chapters to train on")
+
+        data = train_dictionary(samples, options["size"])
+        dictionary = ContentDictionary.objects.create(data=data)
+
+        plain = sum(len(zlib.compress(text.encode(), LEVEL)) for text in samples)
+        primed = sum(len(compress(text, (dictionary.id, data))) for text in samples)
+        raw = sum(len(text.encode()) for text in samples)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Saved dictionary {dictionary.id} ({len(data)} bytes). "
+                f"Samples: {raw} bytes raw, {plain} with zlib, "
+                f"{primed} with the dictionary"
+            )
+        )
+        self.stdout.write("Run compress_chapters --recompress to apply it")
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from novel.ingest import BATCH_SIZE, IngestError, ingest_chapters, parse_upload
+from novel.models import Novel
+
+
+class Command(BaseCommand):
+    help = (
+        "Add chapters to a novel from a zip of text/markdown/html files or one "
+        "file with a '# Title' line before every chapter"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("novel_id", type=int)
+        parser.add_argument("path")
+        parser.add_argument(
+            "--start", type=int, help="Number of the first chapter (default: next)"
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            novel = Novel.objects.get(pk=options["novel_id"])
+        except Novel.DoesNotExist:
+            raise CommandError(f"Novel {options['novel_id']} does not exist")
+
+        created = 0
+        with open(options["path"], "rb") as file:
+            try:
+                for created in ingest_chapters(
+                    novel,
+                    parse_upload(file, options["path"]),
+                    options["start"],
+                    options["batch_size"],
+                ):
+                    self.stdout.write(f"Processed {created} chapters")
+            except IngestError as e:
+                raise CommandError(f"{e}; nothing was saved")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Added {created} chapters to {novel.title}")
+        )
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novel', '0020_alter_bookmark_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='author_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('novel_count', models.IntegerField(default=0)),
+                ('comment_count', models.IntegerField(default=0)),
+                ('novel_comments', models.IntegerField(default=0)),
+                ('total_views', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_reactions(apps, schema_editor):
+    Comment = apps.get_model("novel", "Comment")
+
+    def count(through):
+        return Coalesce(
+            Subquery(
+                through.objects.filter(comment=OuterRef("pk"))
+                .order_by()
+                .values("comment")
+                .annotate(value=Count("pk"))
+                .values("value")[:1]
+            ),
+            0,
+        )
+
+    Comment.objects.update(
+        likes_count=count(Comment.like.through),
+        dislikes_count=count(Comment.dislike.through),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novel', '0021_authorstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='dislikes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_reactions, migrations.RunPython.noop),
+    ]
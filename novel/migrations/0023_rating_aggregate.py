@@ -0,0 +1,84 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+# Keep in sync with novel.ratings.
+PRIOR_MEAN = 5.0
+PRIOR_COUNT = 10
+
+
+def remove_duplicate_ratings(apps, schema_editor):
+    Rating = apps.get_model("novel", "Rating")
+
+    duplicates = (
+        Rating.objects.values("user", "novel")
+        .annotate(latest=Max("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        Rating.objects.filter(
+            user=duplicate["user"], novel=duplicate["novel"], id__lt=duplicate["latest"]
+        ).delete()
+
+
+def build_aggregates(apps, schema_editor):
+    Rating = apps.get_model("novel", "Rating")
+    RatingAggregate = apps.get_model("novel", "RatingAggregate")
+
+    aggregates = {}
+    for row in Rating.objects.values("novel").annotate(
+        count=Count("id"),
+        story_sum=Sum("story"),
+        writing_sum=Sum("writing"),
+        world_sum=Sum("world"),
+        characters_sum=Sum("characters"),
+        average_sum=Sum("average_rating"),
+    ):
+        novel = row.pop("novel")
+        aggregates[novel] = RatingAggregate(
+            novel_id=novel,
+            histogram=[0] * 10,
+            score=(PRIOR_MEAN * PRIOR_COUNT + row["average_sum"])
+            / (PRIOR_COUNT + row["count"]),
+            **row,
+        )
+
+    for row in Rating.objects.values("novel", "average_rating").annotate(
+        total=Count("id")
+    ):
+        bucket = min(max(row["average_rating"], 1), 10) - 1
+        aggregates[row["novel"]].histogram[bucket] += row["total"]
+
+    RatingAggregate.objects.bulk_create(aggregates.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novel', '0022_comment_reaction_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_ratings, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RatingAggregate',
+            fields=[
+                ('novel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_aggregate', serialize=False, to='novel.novel')),
+                ('count', models.IntegerField(default=0)),
+                ('story_sum', models.IntegerField(default=0)),
+                ('writing_sum', models.IntegerField(default=0)),
+                ('world_sum', models.IntegerField(default=0)),
+                ('characters_sum', models.IntegerField(default=0)),
+                ('average_sum', models.IntegerField(default=0)),
+                ('histogram', models.JSONField(default=list)),
+                ('score', models.FloatField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('user', 'novel'), name='unique_rating_per_user'),
+        ),
+        migrations.RunPython(build_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novel', '0023_rating_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novel',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='novel',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='novel_novel_search__d80b5f_gin'),
+        ),
+    ]
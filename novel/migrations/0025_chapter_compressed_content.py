@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:40
+
+import novel.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novel', '0024_novel_search_vector'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='chapter',
+            old_name='content',
+            new_name='content_text',
+        ),
+        migrations.AlterField(
+            model_name='chapter',
+            name='content_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='content',
+            field=novel.fields.CompressedTextField(fallback='content_text', null=True),
+        ),
+        migrations.CreateModel(
+            name='ContentDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novel', '0025_chapter_compressed_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='content_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
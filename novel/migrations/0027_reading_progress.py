@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-18 21:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_reading_positions(apps, schema_editor):
+    Bookmark = apps.get_model("novel", "Bookmark")
+    ReadingProgress = apps.get_model("novel", "ReadingProgress")
+
+    # Chapter bookmarks were reading positions; keep the newest per novel.
+    positions = {}
+    for user, novel, chapter in (
+        Bookmark.objects.filter(chapter__isnull=False, novel__isnull=False)
+        .order_by("id")
+        .values_list("user", "novel", "chapter")
+    ):
+        positions[user, novel] = chapter
+
+    ReadingProgress.objects.bulk_create(
+        [
+            ReadingProgress(user_id=user, novel_id=novel, chapter_id=chapter)
+            for (user, novel), chapter in positions.items()
+        ],
+        batch_size=1000,
+    )
+    Bookmark.objects.filter(chapter__isnull=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novel', '0026_chapter_content_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='novel.chapter')),
+                ('novel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='novel.novel')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'novel'), name='unique_reading_progress')],
+            },
+        ),
+        migrations.RunPython(move_reading_positions, migrations.RunPython.noop),
+    ]
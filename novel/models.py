@@ -1,9 +1,19 @@
+import asyncio
+
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
 
+from novel.fields import CompressedTextField
+from novel.normalize import VERSION as NORMALIZE_VERSION, normalize_content
+
+# Number of most recent comments listed on a profile page.
+PROFILE_COMMENTS = 50
+
 
 class User(AbstractUser):
     user_image = models.ImageField(upload_to="user-images/", null=True, blank=True)
@@ -16,6 +26,9 @@ class User(AbstractUser):
         return self.username
 
     def serialize(self, user):
+        from novel.stats import get_author_stats
+
+        stats = get_author_stats(self.id)
         return {
             "id": self.id,
             "username": self.username,
@@ -24,21 +37,43 @@ class User(AbstractUser):
             ),
             "gender": self.gender if self.gender else "--",
             "date_joined": self.date_joined,
-            "comments_count": self.user_comments.count(),
+            "comments_count": stats.comment_count,
             "comments": [
-                comment.serialize(user)
-                for comment in self.user_comments.all().order_by("-date")
+                {
+                    "id": comment.id,
+                    "comment": comment.comment,
+                    "date": comment.date,
+                    "novel": (
+                        {"novel": comment.novel.title, "id": comment.novel.id}
+                        if comment.novel
+                        else False
+                    ),
+                    "chapter": (
+                        {
+                            "chapter": comment.chapter.title,
+                            "id": comment.chapter.id,
+                            "novel": comment.chapter.novel.title,
+                        }
+                        if comment.chapter
+                        else False
+                    ),
+                }
+                for comment in self.user_comments.select_related(
+                    "novel", "chapter__novel"
+                )
+                .defer(
+                    "chapter__content",
+                    "chapter__content_text",
+                    "chapter__novel__description",
+                )
+                .order_by("-date")[:PROFILE_COMMENTS]
             ],
             "birthday": self.date_of_birth if self.date_of_birth else "--",
             "location": self.location if self.location else "--",
             "about": self.about,
-            "novel_comments": sum(
-                novel.novel_comments.count() for novel in self.user_created_novels.all()
-            ),
-            "total_views": sum(
-                sum(chapter.views for chapter in novel.chapters.all())
-                for novel in self.user_created_novels.all()
-            ),
+            "novel_count": stats.novel_count,
+            "novel_comments": stats.novel_comments,
+            "total_views": stats.total_views,
             "last_login": self.last_login,
             "is_user": user == self,
         }
@@ -62,47 +97,19 @@ class Novel(models.Model):
     last_chapter_scraped = models.TextField(blank=True, null=True)
     fanfic_id = models.CharField(max_length=100, blank=True, null=True)
     ao3_id = models.CharField(max_length=100, blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ["title"]
+        indexes = [GinIndex(fields=["search_vector"])]
 
     def __str__(self):
         return f"{self.title}"
 
     def serialize(self, user):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "description": self.description,
-            "image": (
-                self.novel_image.url if self.novel_image else "/media/placeholder.png"
-            ),
-            "comments": self.novel_comments.count(),
-            "total_comments": self.novel_comments.count()
-            + sum(chapter.chapter_comments.count() for chapter in self.chapters.all()),
-            "views": self.views,
-            "latest_chapter": (
-                self.chapters.order_by("-num").first().num
-                if self.chapters.exists()
-                else None
-            ),
-            "tags": [tag.name for tag in self.tags.all()],
-            "genres": [genre.name for genre in self.genres.all()],
-            "average_rating": (
-                round(
-                    sum(rating.average_rating for rating in self.novel_ratings.all())
-                    / self.novel_ratings.count(),
-                    1,
-                )
-                if self.novel_ratings.exists()
-                else None
-            ),
-            "status": self.status,
-            "num": self.chapters.count(),
-            "date": self.date,
-            "author": self.user.username if self.user else "Unknown",
-            "is_author": self.user == user,
-        }
+        from novel.serializers import serialize_novels
+
+        return serialize_novels([self.pk], user)[0]
 
     def display_chapters(self):
         return self.chapters.count()
@@ -114,7 +121,11 @@ class Chapter(models.Model):
     title = models.TextField()
     num = models.IntegerField()
     date = models.DateTimeField(auto_now_add=True)
-    content = models.TextField()
+    # Uncompressed body of chapters not yet converted by compress_chapters.
+    content_text = models.TextField(blank=True, default="")
+    content = CompressedTextField(null=True, fallback="content_text")
+    # novel.normalize.VERSION the content was last normalized with.
+    content_version = models.PositiveSmallIntegerField(default=0)
     novel = models.ForeignKey(Novel, on_delete=models.CASCADE, related_name="chapters")
     views = models.IntegerField(default=0)
 
@@ -144,17 +155,21 @@ class Chapter(models.Model):
         }
 
     def view(self):
-        try:
-            previous = Chapter.objects.filter(num=self.num - 1, novel=self.novel)[0].id
+        from novel.toc import get_toc
 
-        except IndexError:
-            previous = None
+        toc = get_toc(self.novel_id)
+        return self._view(toc, self.chapter_comments.count())
 
-        try:
-            next = Chapter.objects.filter(num=self.num + 1, novel=self.novel)[0].id
+    async def aview(self):
+        from novel.toc import aget_toc
 
-        except IndexError:
-            next = None
+        toc, comments = await asyncio.gather(
+            aget_toc(self.novel_id), self.chapter_comments.acount()
+        )
+        return self._view(toc, comments)
+
+    def _view(self, toc, comments):
+        previous, next = toc.neighbours(self.id, self.num)
 
         return {
             "id": self.id,
@@ -162,11 +177,15 @@ class Chapter(models.Model):
             "novel_id": self.novel.id,
             "title": self.title,
             "num": self.num,
-            "content": self.content,
+            "content": (
+                self.content
+                if self.content_version >= NORMALIZE_VERSION
+                else normalize_content(self.content)
+            ),
             "views": self.views,
             "previous": previous,
             "next": next,
-            "comments": self.chapter_comments.count(),
+            "comments": comments,
         }
 
 
@@ -195,40 +214,13 @@ class Comment(models.Model):
     )
     like = models.ManyToManyField(User, related_name="likes", blank=True)
     dislike = models.ManyToManyField(User, related_name="dislikes", blank=True)
+    likes_count = models.IntegerField(default=0)
+    dislikes_count = models.IntegerField(default=0)
 
     def serialize(self, user):
-        return {
-            "id": self.id,
-            "user": self.user.username,
-            "image": (
-                self.user.user_image.url
-                if self.user.user_image
-                else "/media/placeholder.png"
-            ),
-            "comment": self.comment,
-            "date": self.date,
-            "likesCount": self.like.count(),
-            "dislikesCount": self.dislike.count(),
-            "liked": user.is_authenticated and self.like.filter(id=user.id).exists(),
-            "disliked": user.is_authenticated
-            and self.dislike.filter(id=user.id).exists(),
-            "isAuthor": user == self.user,
-            "replies": [reply.serialize(user) for reply in self.replies.all()],
-            "novel": (
-                {"novel": self.novel.title, "id": self.novel.id}
-                if self.novel
-                else False
-            ),
-            "chapter": (
-                {
-                    "chapter": self.chapter.title,
-                    "id": self.chapter.id,
-                    "novel": self.chapter.novel.title,
-                }
-                if self.chapter
-                else False
-            ),
-        }
+        from novel.serializers import serialize_comment_trees
+
+        return serialize_comment_trees([self.pk], user)[0]
 
 
 class Tag(models.Model):
@@ -267,6 +259,43 @@ class Rating(models.Model):
         default=1, validators=[MinValueValidator(1), MaxValueValidator(10)]
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "novel"], name="unique_rating_per_user"
+            )
+        ]
+
+
+class RatingAggregate(models.Model):
+    novel = models.OneToOneField(
+        Novel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rating_aggregate",
+    )
+    count = models.IntegerField(default=0)
+    story_sum = models.IntegerField(default=0)
+    writing_sum = models.IntegerField(default=0)
+    world_sum = models.IntegerField(default=0)
+    characters_sum = models.IntegerField(default=0)
+    average_sum = models.IntegerField(default=0)
+    # histogram[i] is the number of ratings whose average_rating is i + 1.
+    histogram = models.JSONField(default=list)
+    score = models.FloatField(default=0, db_index=True)
+
+    def serialize(self):
+        return {
+            "story": self.story_sum / self.count,
+            "characters": self.characters_sum / self.count,
+            "world": self.world_sum / self.count,
+            "writing": self.writing_sum / self.count,
+            "average": self.average_sum / self.count,
+            "histogram": self.histogram,
+            "score": self.score,
+            "count": self.count,
+        }
+
 
 class Bookmark(models.Model):
     user = models.ForeignKey(
@@ -274,3 +303,44 @@ class Bookmark(models.Model):
     )
     novel = models.ForeignKey(Novel, on_delete=models.CASCADE, null=True, blank=True)
     chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, null=True, blank=True)
+
+
+class ReadingProgress(models.Model):
+    """
+    The last chapter a user read in a novel. Written in batches from the
+    Redis buffer in ``novel.progress``, not on every read.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="reading_progress"
+    )
+    novel = models.ForeignKey(Novel, on_delete=models.CASCADE)
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE)
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "novel"], name="unique_reading_progress"
+            )
+        ]
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="author_stats"
+    )
+    novel_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    novel_comments = models.IntegerField(default=0)
+    total_views = models.BigIntegerField(default=0)
+
+
+class ContentDictionary(models.Model):
+    """
+    A zlib preset dictionary for compressed chapter content. Rows are never
+    changed or deleted once chapters have been compressed with them.
+    """
+
+    data = models.BinaryField()
+    date = models.DateTimeField(auto_now_add=True)
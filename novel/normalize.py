@@ -0,0 +1,238 @@
+"""
+Write-time chapter content normalization.
+
+Chapter bodies are normalized once when they are saved rather than every
+time they are read or exported. Scripts, styles and embeds (the scraped
+``window.pubfuturetag`` ad snippets among them) are dropped together with
+their contents. Block structure is reshaped into a flat run of ``<p>``
+paragraphs, and inside them only the inline tags in ``INLINE_TAGS`` are
+kept, without attributes except a safe ``href`` on links; any other
+element is replaced by its contents. Plain text becomes one paragraph per
+non-empty line. ``Chapter.content_version`` records which ``VERSION`` of
+these rules a row went through; bump it when the rules change and re-run
+``manage.py normalize_chapters``.
+
+Only BeautifulSoup is needed, so ``ebook.py`` and worker processes can use
+this module without setting up Django.
+"""
+
+import html
+import re
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+from novel.compression import compress
+
+# 2: inline formatting is kept instead of flattening markup to text.
+VERSION = 2
+
+# Elements removed together with everything inside them.
+DROP_TAGS = [
+    "script",
+    "style",
+    "noscript",
+    "iframe",
+    "object",
+    "embed",
+    "ins",
+    "head",
+    "template",
+    "svg",
+]
+
+# Text left behind by ad snippets whose <script> wrapper was already lost.
+AD_MARKERS = ["window.pubfuturetag", "pubfuturetag.push"]
+
+# Elements that end the current paragraph and start a new one.
+BLOCK_TAGS = [
+    "p",
+    "div",
+    "li",
+    "ul",
+    "ol",
+    "dl",
+    "dt",
+    "dd",
+    "blockquote",
+    "pre",
+    "hr",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "table",
+    "tr",
+    "section",
+    "article",
+    "header",
+    "footer",
+    "aside",
+    "figure",
+]
+
+# Elements kept inside paragraphs; "i" and "b" are written as is, not
+# replaced by "em" and "strong".
+INLINE_TAGS = [
+    "em",
+    "strong",
+    "i",
+    "b",
+    "u",
+    "s",
+    "sub",
+    "sup",
+    "small",
+    "code",
+    "a",
+]
+
+# Table cells are separated by a space rather than run together.
+CELL_TAGS = ["td", "th"]
+
+# Link schemes kept; links without a scheme (relative ones) are kept too.
+SAFE_SCHEMES = ["http", "https", "mailto"]
+
+
+def _href(value):
+    # Browsers ignore control characters and spaces inside a scheme, so
+    # "java\tscript:" must be caught as well.
+    cleaned = re.sub(r"[\x00-\x20\x7f]+", "", value or "")
+    scheme = re.match(r"([a-zA-Z][a-zA-Z0-9+.-]*):", cleaned)
+    if not cleaned or (scheme and scheme[1].lower() not in SAFE_SCHEMES):
+        return None
+    return value.strip()
+
+
+class _Writer:
+    """
+    Collects paragraphs while the parsed tree is walked. Inline elements
+    that span a paragraph break are closed at the end of one paragraph and
+    reopened in the next; a start tag is only written once the paragraph has
+    text in it, so no empty formatting is left around removed content.
+    """
+
+    def __init__(self, lines):
+        # Plain text: every newline ends a paragraph.
+        self.lines = lines
+        self.paragraphs = []
+        # [name, start tag, written in this paragraph] per open element.
+        self.open = []
+        self.start_paragraph()
+
+    def start_paragraph(self):
+        self.parts = []
+        self.text = []
+        self.breaks = 0
+
+    def end_paragraph(self):
+        if self.parts and self.parts[-1] == " ":
+            self.parts.pop()
+        for element in reversed(self.open):
+            if element[2]:
+                self.parts.append(f"</{element[0]}>")
+                element[2] = False
+        text = "".join(self.text)
+        if text.strip() and not any(marker in text for marker in AD_MARKERS):
+            self.paragraphs.append(f"<p>{''.join(self.parts)}</p>")
+        self.start_paragraph()
+
+    def space(self):
+        if self.text and self.parts[-1] != " ":
+            self.parts.append(" ")
+
+    def write(self, text):
+        if self.text and self.breaks:
+            if self.breaks > 1:
+                # A blank line made of <br>s separates paragraphs.
+                self.end_paragraph()
+            else:
+                if self.parts[-1] == " ":
+                    self.parts.pop()
+                self.parts.append("<br/>")
+        self.breaks = 0
+        for element in self.open:
+            if not element[2]:
+                self.parts.append(element[1])
+                element[2] = True
+        self.parts.append(html.escape(text, quote=False))
+        self.text.append(text)
+
+    def string(self, string):
+        lines = string.split("\n") if self.lines else [string]
+        for i, line in enumerate(lines):
+            if i:
+                self.end_paragraph()
+            line = re.sub(r"\s+", " ", line)
+            if line.startswith(" "):
+                self.space()
+            if line.strip():
+                self.write(line.strip())
+                if line.endswith(" "):
+                    self.space()
+
+    def walk(self, node):
+        for child in node.children:
+            if isinstance(child, Tag):
+                self.element(child)
+            # Comments, CDATA, doctypes and the like are subclasses.
+            elif type(child) is NavigableString:
+                self.string(str(child))
+
+    def element(self, tag):
+        if tag.name in DROP_TAGS:
+            return
+        if tag.name == "br":
+            self.breaks += 1
+        elif tag.name in BLOCK_TAGS:
+            self.end_paragraph()
+            self.walk(tag)
+            self.end_paragraph()
+        elif tag.name in CELL_TAGS:
+            self.space()
+            self.walk(tag)
+            self.space()
+        elif tag.name in INLINE_TAGS:
+            start = f"<{tag.name}>"
+            if tag.name == "a":
+                href = _href(tag.get("href"))
+                if href is None:
+                    self.walk(tag)
+                    return
+                start = f'<a href="{html.escape(href)}">'
+            element = [tag.name, start, False]
+            self.open.append(element)
+            self.walk(tag)
+            self.open.remove(element)
+            if element[2]:
+                if self.parts[-1] == " ":
+                    # "<em>word </em>" is written "<em>word</em> ".
+                    self.parts.pop()
+                    self.parts.append(f"</{tag.name}>")
+                    self.parts.append(" ")
+                else:
+                    self.parts.append(f"</{tag.name}>")
+        else:
+            self.walk(tag)
+
+
+def normalize_content(content):
+    """
+    Return ``content`` (HTML or plain text) as sanitized ``<p>`` paragraphs.
+    """
+    soup = BeautifulSoup(content or "", "html.parser")
+    writer = _Writer(lines=soup.find(BLOCK_TAGS + ["br"]) is None)
+    writer.walk(soup)
+    writer.end_paragraph()
+    return "".join(writer.paragraphs)
+
+
+def normalize_rows(rows, dictionary):
+    """
+    Normalize and compress (id, content) rows; runs in worker processes.
+
+    Returns:
+        list: (id, compressed content) tuples.
+    """
+    return [(id, compress(normalize_content(text), dictionary)) for id, text in rows]
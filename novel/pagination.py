@@ -0,0 +1,172 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``COUNT(*)`` plus ``OFFSET``, a page is fetched with a range
+condition on the sort key of the last row seen, e.g. for ``-views, -id``:
+
+    WHERE views < %s OR (views = %s AND id < %s) ORDER BY views DESC, id DESC
+
+so every page costs one index range scan no matter how deep it is. The sort
+key is handed to the client as an opaque, signed cursor that also carries an
+approximate page number for display.
+"""
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+SALT = "novel.pagination"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, number, next, previous):
+        self.object_list = object_list
+        self.number = number
+        self.next = next
+        self.previous = previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by its ordering.
+
+    Args:
+        queryset: The queryset to paginate. Its ordering (or ``ordering``)
+            must end in a unique field such as ``id``.
+        per_page (int): Rows per page.
+        ordering (list): Sort fields, e.g. ["-views", "-id"]; defaults to
+            the queryset's own order_by().
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.ordering = list(ordering or queryset.query.order_by)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+
+    def _fields(self):
+        return [(field.lstrip("-"), field.startswith("-")) for field in self.ordering]
+
+    def _key(self, row):
+        return [getattr(row, name) for name, _ in self._fields()]
+
+    def _encode(self, row, direction, number):
+        values = []
+        for value in self._key(row):
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return signing.dumps(
+            {"v": values, "d": direction, "p": number}, salt=SALT, compress=True
+        )
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=SALT)
+            values = data["v"]
+        except (signing.BadSignature, KeyError, TypeError):
+            raise InvalidCursor(cursor)
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+
+        model = self.queryset.model
+        for i, (name, _) in enumerate(self._fields()):
+            try:
+                values[i] = model._meta.get_field(name).to_python(values[i])
+            except FieldDoesNotExist:
+                # Annotations such as a search rank are plain JSON values.
+                pass
+        return values, data["d"], data["p"]
+
+    def _after(self, values, backwards):
+        # Lexicographic "comes after" on (f1, f2, ...) honoring each field's
+        # direction: f1 > v1 OR (f1 = v1 AND f2 > v2) OR ...
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self._fields(), values):
+            lookup = "lt" if descending != backwards else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _reversed(self):
+        return [
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        ]
+
+    def page(self, cursor=None, number=1):
+        """
+        Return the page a cursor points to.
+
+        Without a cursor, page ``number`` is read with an OFFSET so that
+        numbered links keep working; the cursors it returns switch the
+        client over to keyset reads.
+
+        Raises:
+            InvalidCursor: If the cursor is malformed or was tampered with.
+        """
+        offset = 0
+        if cursor:
+            values, direction, number = self._decode(cursor)
+        else:
+            values, direction = None, "next"
+            number = max(number, 1)
+            offset = (number - 1) * self.per_page
+
+        backwards = direction == "previous"
+        queryset = self.queryset
+        if backwards:
+            queryset = queryset.order_by(*self._reversed())
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+
+        rows = list(queryset[offset : offset + self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        has_next = more if not backwards else values is not None
+        has_previous = more if backwards else values is not None or offset > 0
+
+        return KeysetPage(
+            rows,
+            number,
+            self._encode(rows[-1], "next", number + 1) if rows and has_next else None,
+            (
+                self._encode(rows[0], "previous", max(number - 1, 1))
+                if rows and has_previous
+                else None
+            ),
+        )
+
+    def rows(self, cursor=None, chunk_size=100):
+        """
+        Iterate over every row after a "next" cursor (or from the start)
+        with a server-side cursor, ``chunk_size`` rows at a time.
+
+        Raises:
+            InvalidCursor: If the cursor is malformed, tampered with or
+                points backwards.
+        """
+        queryset = self.queryset
+        if cursor:
+            values, direction, _ = self._decode(cursor)
+            if direction != "next":
+                raise InvalidCursor(cursor)
+            queryset = queryset.filter(self._after(values, False))
+        return queryset.iterator(chunk_size=chunk_size)
+
+    def cursor_after(self, row):
+        """
+        Return a cursor for reading on after ``row`` with ``rows``.
+        """
+        return self._encode(row, "next", None)
@@ -0,0 +1,166 @@
+"""
+Write-behind reading progress.
+
+Reading a chapter records it as the user's position in that novel with a
+single Redis round trip instead of database writes:
+
+* ``genesis:progress:<user id>`` is a hash of novel id -> last chapter id.
+  It answers ``last_read`` ("continue reading") and is filled from
+  ``ReadingProgress`` on a miss; 0 means the user has no position there.
+* ``genesis:progress:dirty`` holds ``<user id>:<novel id>`` -> chapter id
+  for positions not saved yet, so repeated reads of a novel coalesce into
+  one row. ``flush_progress`` (the ``flush_progress`` management command)
+  upserts them into ``ReadingProgress`` in batches.
+
+Library bookmarks (``Bookmark``) are not touched by reading.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from novel.asyncredis import get_connection
+from novel.models import Chapter, ReadingProgress, User
+
+DIRTY_KEY = "genesis:progress:dirty"
+FLUSHING_SUFFIX = ":flushing"
+
+# Positions of users who stop reading drop out of Redis after this long.
+PROGRESS_TTL = 30 * 24 * 60 * 60
+
+
+def _user_key(user_id):
+    return f"genesis:progress:{user_id}"
+
+
+def _record(pipe, user_id, novel_id, chapter_id):
+    key = _user_key(user_id)
+    pipe.hset(key, novel_id, chapter_id)
+    pipe.expire(key, PROGRESS_TTL)
+    pipe.hset(DIRTY_KEY, f"{user_id}:{novel_id}", chapter_id)
+    return pipe
+
+
+def record_progress(user_id, novel_id, chapter_id):
+    """
+    Buffer ``chapter_id`` as the chapter ``user_id`` last read in a novel.
+    """
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    _record(pipe, user_id, novel_id, chapter_id).execute()
+
+
+async def arecord_progress(user_id, novel_id, chapter_id):
+    pipe = get_connection().pipeline(transaction=False)
+    await _record(pipe, user_id, novel_id, chapter_id).execute()
+
+
+def _unflushed(pipe, user_id, novel_id):
+    # Evicted or never loaded: an unflushed position still wins over the
+    # database.
+    field = f"{user_id}:{novel_id}"
+    pipe.hget(DIRTY_KEY, field)
+    pipe.hget(DIRTY_KEY + FLUSHING_SUFFIX, field)
+    return pipe
+
+
+def _remember(pipe, user_id, novel_id, chapter_id):
+    key = _user_key(user_id)
+    pipe.hsetnx(key, novel_id, chapter_id)
+    pipe.expire(key, PROGRESS_TTL)
+    return pipe
+
+
+def _saved(user_id, novel_id):
+    return ReadingProgress.objects.filter(
+        user_id=user_id, novel_id=novel_id
+    ).values_list("chapter_id", flat=True)
+
+
+def last_read(user_id, novel_id):
+    """
+    Return the id of the chapter ``user_id`` last read in a novel, or None.
+    """
+    redis = get_redis_connection("default")
+    chapter_id = redis.hget(_user_key(user_id), novel_id)
+    if chapter_id is None:
+        dirty, flushing = _unflushed(redis.pipeline(), user_id, novel_id).execute()
+        chapter_id = dirty or flushing or _saved(user_id, novel_id).first() or 0
+        _remember(redis.pipeline(), user_id, novel_id, chapter_id).execute()
+
+    return int(chapter_id) or None
+
+
+async def alast_read(user_id, novel_id):
+    redis = get_connection()
+    chapter_id = await redis.hget(_user_key(user_id), novel_id)
+    if chapter_id is None:
+        pipe = _unflushed(redis.pipeline(), user_id, novel_id)
+        dirty, flushing = await pipe.execute()
+        chapter_id = dirty or flushing or await _saved(user_id, novel_id).afirst() or 0
+        await _remember(redis.pipeline(), user_id, novel_id, chapter_id).execute()
+
+    return int(chapter_id) or None
+
+
+def _existing(model, ids, batch_size):
+    ids = list(ids)
+    found = set()
+    for i in range(0, len(ids), batch_size):
+        found.update(
+            model.objects.filter(pk__in=ids[i : i + batch_size]).values_list(
+                "pk", flat=True
+            )
+        )
+    return found
+
+
+def flush_progress(batch_size=500):
+    """
+    Save buffered reading positions to ``ReadingProgress``.
+
+    Args:
+        batch_size (int): Maximum number of rows per statement.
+
+    Returns:
+        int: Number of positions saved.
+    """
+    redis = get_redis_connection("default")
+    flushing = DIRTY_KEY + FLUSHING_SUFFIX
+
+    # As in novel.counters: retry a batch left behind by a failed run
+    # before taking the next one.
+    if not redis.exists(flushing):
+        try:
+            redis.rename(DIRTY_KEY, flushing)
+        except ResponseError:
+            return 0
+
+    positions = {}
+    for field, chapter_id in redis.hgetall(flushing).items():
+        user_id, novel_id = map(int, field.split(b":"))
+        positions[user_id, novel_id] = int(chapter_id)
+
+    # Users and chapters may have been deleted since they were read.
+    users = _existing(User, {user for user, _ in positions}, batch_size)
+    chapters = _existing(Chapter, set(positions.values()), batch_size)
+    now = timezone.now()
+    rows = [
+        ReadingProgress(
+            user_id=user_id, novel_id=novel_id, chapter_id=chapter_id, date=now
+        )
+        for (user_id, novel_id), chapter_id in positions.items()
+        if user_id in users and chapter_id in chapters
+    ]
+
+    with transaction.atomic():
+        ReadingProgress.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["user", "novel"],
+            update_fields=["chapter", "date"],
+        )
+    redis.delete(flushing)
+
+    return len(rows)
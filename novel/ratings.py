@@ -0,0 +1,73 @@
+"""
+Running rating aggregates.
+
+Each novel has one ``RatingAggregate`` row with per-category sums, a
+histogram of overall ratings and a Bayesian-weighted score. The Rating
+signal handlers in ``novel.signals`` apply every insert, change and delete
+to it under a row lock in the same transaction as the rating write.
+"""
+
+from django.db import transaction
+
+from novel.models import RatingAggregate
+
+CATEGORIES = ["story", "writing", "world", "characters"]
+
+# Bayesian prior: every novel starts as if it had PRIOR_COUNT ratings of
+# PRIOR_MEAN, so a single 10/10 doesn't outrank a hundred 9/10s.
+PRIOR_MEAN = 5.0
+PRIOR_COUNT = 10
+
+
+def bayesian_score(average_sum, count):
+    return (PRIOR_MEAN * PRIOR_COUNT + average_sum) / (PRIOR_COUNT + count)
+
+
+def _add(aggregate, values, sign):
+    aggregate.count += sign
+    for category in CATEGORIES:
+        field = f"{category}_sum"
+        setattr(aggregate, field, getattr(aggregate, field) + sign * values[category])
+    aggregate.average_sum += sign * values["average_rating"]
+
+    histogram = aggregate.histogram or [0] * 10
+    bucket = min(max(values["average_rating"], 1), 10) - 1
+    histogram[bucket] += sign
+    aggregate.histogram = histogram
+
+
+def rating_values(rating):
+    # Integer fields accept floats (the views assign fmean()) and truncate
+    # them on save, so do the same here.
+    return {
+        field: int(getattr(rating, field)) for field in CATEGORIES + ["average_rating"]
+    }
+
+
+def apply_rating(novel_id, old=None, new=None):
+    """
+    Move a novel's aggregate from one rating state to another.
+
+    Args:
+        novel_id (int): The rated novel.
+        old (dict): Values of the rating before the write, or None on insert.
+        new (dict): Values after the write, or None on delete.
+    """
+    with transaction.atomic():
+        aggregates = RatingAggregate.objects.select_for_update()
+        if new:
+            aggregate, _ = aggregates.get_or_create(novel_id=novel_id)
+        else:
+            # Deletes may come from a cascade that already removed the
+            # aggregate along with its novel; never recreate it here.
+            aggregate = aggregates.filter(novel_id=novel_id).first()
+            if aggregate is None:
+                return
+
+        if old:
+            _add(aggregate, old, -1)
+        if new:
+            _add(aggregate, new, 1)
+
+        aggregate.score = bayesian_score(aggregate.average_sum, aggregate.count)
+        aggregate.save()
@@ -0,0 +1,102 @@
+"""
+Comment reactions.
+
+``Comment.likes_count`` / ``dislikes_count`` store the size of the like and
+dislike M2M sets. ``toggle_reaction`` changes a user's reaction and both
+counters in one transaction while holding the comment's row lock, so
+concurrent clicks cannot double count. ``reconcile_reactions`` repairs any
+drift from writes that bypassed it.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+
+from novel.models import Comment
+
+Like = Comment.like.through
+Dislike = Comment.dislike.through
+
+
+def toggle_reaction(comment_id, user, reaction):
+    """
+    Toggle a user's like or dislike on a comment.
+
+    Liking removes an existing dislike and vice versa.
+
+    Args:
+        comment_id (int): Comment to react to.
+        user (User): The reacting user.
+        reaction (str): "like" or "dislike".
+
+    Returns:
+        dict: The comment's new liked/disliked state for the user and counts.
+    """
+    own, other = (Like, Dislike) if reaction == "like" else (Dislike, Like)
+
+    with transaction.atomic():
+        comment = get_object_or_404(
+            Comment.objects.select_for_update().only("likes_count", "dislikes_count"),
+            pk=comment_id,
+        )
+
+        own_delta = -own.objects.filter(
+            comment_id=comment.id, user_id=user.id
+        ).delete()[0]
+        other_delta = 0
+        if not own_delta:
+            own.objects.create(comment_id=comment.id, user_id=user.id)
+            own_delta = 1
+            other_delta = -other.objects.filter(
+                comment_id=comment.id, user_id=user.id
+            ).delete()[0]
+
+        like_delta, dislike_delta = (
+            (own_delta, other_delta) if reaction == "like" else (other_delta, own_delta)
+        )
+        if like_delta or dislike_delta:
+            Comment.objects.filter(pk=comment.id).update(
+                likes_count=F("likes_count") + like_delta,
+                dislikes_count=F("dislikes_count") + dislike_delta,
+            )
+
+    return {
+        "liked": reaction == "like" and own_delta > 0,
+        "disliked": reaction == "dislike" and own_delta > 0,
+        "likesCount": comment.likes_count + like_delta,
+        "dislikesCount": comment.dislikes_count + dislike_delta,
+    }
+
+
+def _count(through):
+    return Coalesce(
+        Subquery(
+            through.objects.filter(comment=OuterRef("pk"))
+            .order_by()
+            .values("comment")
+            .annotate(value=Count("pk"))
+            .values("value")[:1]
+        ),
+        0,
+    )
+
+
+def reconcile_reactions(queryset):
+    """
+    Reset stored reaction counters that differ from the M2M tables.
+
+    Returns:
+        int: Number of comments repaired.
+    """
+    drifted = list(
+        queryset.annotate(actual_likes=_count(Like), actual_dislikes=_count(Dislike))
+        .exclude(likes_count=F("actual_likes"), dislikes_count=F("actual_dislikes"))
+        .only("likes_count", "dislikes_count")
+    )
+    for comment in drifted:
+        comment.likes_count = comment.actual_likes
+        comment.dislikes_count = comment.actual_dislikes
+
+    Comment.objects.bulk_update(drifted, ["likes_count", "dislikes_count"])
+    return len(drifted)
@@ -0,0 +1,126 @@
+"""
+Compact cache records for model instances.
+
+Instead of pickling ``Novel``/``Chapter`` instances (model state, field
+caches and class references included), the views cache plain tuples of the
+column values they need. Compressed fields (chapter content) are kept in
+their stored form and only inflated when rendered; other text values of
+``COMPRESS_MIN`` bytes or more are stored zlib-compressed. Instances are
+rebuilt with ``Model.from_db``, so columns left out of a record are simply
+deferred.
+
+``FORMAT`` is part of every cache key; bump it whenever a field list
+changes so old records are ignored instead of misread.
+"""
+
+import zlib
+
+from django.shortcuts import get_object_or_404
+
+from novel.caching import acached, cached
+from novel.fields import CompressedTextField
+from novel.models import Chapter, Novel
+
+FORMAT = 3
+COMPRESS_MIN = 1024
+
+# Attnames in model field order, as Model.from_db expects them.
+NOVEL_FIELDS = (
+    "id",
+    "user_id",
+    "creator",
+    "title",
+    "description",
+    "date",
+    "novel_image",
+    "status",
+    "views",
+)
+CHAPTER_FIELDS = (
+    "id",
+    "title",
+    "num",
+    "date",
+    "content",
+    "content_version",
+    "novel_id",
+    "views",
+)
+
+
+def _fields(model, attnames):
+    by_attname = {field.attname: field for field in model._meta.concrete_fields}
+    return [by_attname[name] for name in attnames]
+
+
+def pack(instance, fields):
+    """
+    Return the values of ``fields`` (attnames) of ``instance`` as a tuple.
+    """
+    record = []
+    for field in _fields(instance, fields):
+        if isinstance(field, CompressedTextField):
+            record.append(field.compressed(instance))
+            continue
+        value = field.get_prep_value(getattr(instance, field.attname))
+        if isinstance(value, str) and len(value) >= COMPRESS_MIN:
+            value = zlib.compress(value.encode())
+        record.append(value)
+    return tuple(record)
+
+
+def unpack(model, fields, record):
+    values = [
+        (
+            zlib.decompress(value).decode()
+            if isinstance(value, bytes) and not isinstance(field, CompressedTextField)
+            else value
+        )
+        for field, value in zip(_fields(model, fields), record)
+    ]
+    return model.from_db("default", fields, values)
+
+
+def record_key(key):
+    return f"{key}:r{FORMAT}"
+
+
+def _novel_args(id):
+    return (
+        record_key(f"novel_{id}"),
+        lambda: pack(get_object_or_404(Novel, pk=id), NOVEL_FIELDS),
+    )
+
+
+def _chapter_args(id, timeout):
+    return (
+        record_key(f"chapter_{id}"),
+        lambda: pack(get_object_or_404(Chapter, pk=id), CHAPTER_FIELDS),
+        timeout,
+    )
+
+
+def get_novel(id):
+    """
+    Return the Novel with the given id from the cache, or raise Http404.
+    """
+    record = cached(*_novel_args(id), tags=[f"novel:{id}"])
+    return unpack(Novel, NOVEL_FIELDS, record)
+
+
+async def aget_novel(id):
+    record = await acached(*_novel_args(id), tags=[f"novel:{id}"])
+    return unpack(Novel, NOVEL_FIELDS, record)
+
+
+def get_chapter(id, timeout=300):
+    """
+    Return the Chapter with the given id from the cache, or raise Http404.
+    """
+    record = cached(*_chapter_args(id, timeout), tags=[f"chapter:{id}"])
+    return unpack(Chapter, CHAPTER_FIELDS, record)
+
+
+async def aget_chapter(id, timeout=300):
+    record = await acached(*_chapter_args(id, timeout), tags=[f"chapter:{id}"])
+    return unpack(Chapter, CHAPTER_FIELDS, record)
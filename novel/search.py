@@ -0,0 +1,83 @@
+"""
+Full-text novel search.
+
+Every novel carries a weighted ``search_vector``: title (A), author, tags
+and genres (B) and description (C). It is refreshed by the signal handlers
+in ``novel.signals`` whenever a novel or its tags/genres change, and backed
+by a GIN index so matching stays an index lookup however large the catalog
+gets. The vector relies on PostgreSQL; other databases fall back to a title
+substring match.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, TextField, Value
+
+from novel.helpers import html_to_text
+from novel.models import Novel
+
+CONFIG = "english"
+
+
+def search_enabled():
+    return connection.vendor == "postgresql"
+
+
+def _vector(text, weight):
+    return SearchVector(
+        Value(text or "", output_field=TextField()), weight=weight, config=CONFIG
+    )
+
+
+def update_search_vectors(novel_ids):
+    """
+    Recompute the search vector of the given novels.
+    """
+    if not search_enabled():
+        return
+
+    novels = (
+        Novel.objects.filter(pk__in=novel_ids)
+        .select_related("user")
+        .prefetch_related("tags", "genres")
+        .only("title", "creator", "description", "user__username")
+    )
+    for novel in novels:
+        people = " ".join(
+            filter(None, [novel.user.username if novel.user else None, novel.creator])
+        )
+        labels = " ".join(
+            [tag.name for tag in novel.tags.all()]
+            + [genre.name for genre in novel.genres.all()]
+        )
+        Novel.objects.filter(pk=novel.pk).update(
+            search_vector=_vector(novel.title, "A")
+            + _vector(f"{people} {labels}", "B")
+            + _vector(html_to_text(novel.description or ""), "C")
+        )
+
+
+def search_novels(query):
+    """
+    Return novels matching ``query``, best matches first.
+
+    Args:
+        query (str): Free text as typed by the user; quoted phrases, "or"
+            and "-word" are understood.
+
+    Returns:
+        QuerySet: Matching novels ordered by rank, then popularity.
+    """
+    query = (query or "").strip()
+    if not query:
+        return Novel.objects.none()
+
+    if not search_enabled():
+        return Novel.objects.filter(title__icontains=query).order_by("-views", "id")
+
+    search_query = SearchQuery(query, search_type="websearch", config=CONFIG)
+    return (
+        Novel.objects.filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F("search_vector"), search_query))
+        .order_by("-rank", "-views", "id")
+    )
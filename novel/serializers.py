@@ -0,0 +1,244 @@
+"""
+Batch serializers.
+
+``serialize_novels`` produces the same dicts as ``Novel.serialize`` for a
+whole page of novels with a constant number of queries: one annotated
+query for the counters plus one prefetch each for tags and genres.
+``serialize_comment_trees`` does the same for ``Comment.serialize``: a page
+of top-level comments and all of their replies are loaded with a single
+recursive query and assembled into trees in memory.
+"""
+
+from django.db import connection
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    F,
+    Max,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Value,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from novel.models import Chapter, Comment, Novel
+
+
+def _aggregate(queryset, field, function):
+    # Correlated subqueries instead of joins: counting comments, chapters
+    # and ratings through joins on the same query would multiply rows.
+    return Subquery(
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(value=function)
+        .values("value")[:1]
+    )
+
+
+def annotate_novels(queryset):
+    return (
+        queryset.select_related("user")
+        .prefetch_related("tags", "genres")
+        .defer("search_vector")
+        .annotate(
+            comments_count=Coalesce(
+                _aggregate(Comment.objects, "novel", Count("pk")), 0
+            ),
+            chapter_comments_count=Coalesce(
+                _aggregate(Comment.objects, "chapter__novel", Count("pk")), 0
+            ),
+            chapters_count=Coalesce(
+                _aggregate(Chapter.objects, "novel", Count("pk")), 0
+            ),
+            latest_chapter_num=_aggregate(Chapter.objects, "novel", Max("num")),
+            rating_count=F("rating_aggregate__count"),
+            rating_sum=F("rating_aggregate__average_sum"),
+        )
+    )
+
+
+def _ids(objects):
+    if isinstance(objects, QuerySet):
+        return list(objects.values_list("pk", flat=True))
+    return [object.pk if hasattr(object, "pk") else object for object in objects]
+
+
+def _fetch(novels):
+    if isinstance(novels, QuerySet) and not novels.query.is_sliced:
+        return list(annotate_novels(novels))
+
+    # Lists of ids/instances and sliced querysets: load by primary key and
+    # put the rows back in the caller's order.
+    ids = _ids(novels)
+    if not ids:
+        return []
+
+    rows = {
+        novel.pk: novel for novel in annotate_novels(Novel.objects.filter(pk__in=ids))
+    }
+    return [rows[id] for id in ids if id in rows]
+
+
+def serialize_novel(novel, user):
+    """
+    Serialize a novel loaded through ``annotate_novels``.
+    """
+    return {
+        "id": novel.id,
+        "title": novel.title,
+        "description": novel.description,
+        "image": (
+            novel.novel_image.url if novel.novel_image else "/media/placeholder.png"
+        ),
+        "comments": novel.comments_count,
+        "total_comments": novel.comments_count + novel.chapter_comments_count,
+        "views": novel.views,
+        "latest_chapter": novel.latest_chapter_num,
+        "tags": [tag.name for tag in novel.tags.all()],
+        "genres": [genre.name for genre in novel.genres.all()],
+        "average_rating": (
+            round(novel.rating_sum / novel.rating_count, 1)
+            if novel.rating_count
+            else None
+        ),
+        "status": novel.status,
+        "num": novel.chapters_count,
+        "date": novel.date,
+        "author": novel.user.username if novel.user else "Unknown",
+        "is_author": user.is_authenticated and novel.user_id == user.id,
+    }
+
+
+def serialize_novels(novels, user):
+    """
+    Serialize many novels in a constant number of queries.
+
+    Args:
+        novels: A Novel queryset (sliced or not), or a list of novel ids
+            or Novel instances.
+        user: The requesting user, used for the ``is_author`` flag.
+
+    Returns:
+        list: ``Novel.serialize``-shaped dicts in the order of ``novels``.
+    """
+    return [serialize_novel(novel, user) for novel in _fetch(novels)]
+
+
+async def aserialize_novels(ids, user):
+    """
+    Async ``serialize_novels`` for a list of novel ids.
+    """
+    rows = {
+        novel.pk: novel
+        async for novel in annotate_novels(Novel.objects.filter(pk__in=ids))
+    }
+    return [serialize_novel(rows[id], user) for id in ids if id in rows]
+
+
+def _descendants_sql(root_ids):
+    table = connection.ops.quote_name(Comment._meta.db_table)
+    placeholders = ", ".join(["%s"] * len(root_ids))
+    sql = f"""
+        WITH RECURSIVE tree (id) AS (
+            SELECT id FROM {table} WHERE id IN ({placeholders})
+            UNION ALL
+            SELECT c.id FROM {table} c JOIN tree ON c.parent_comment_id = tree.id
+        )
+        SELECT id FROM tree
+    """
+    return RawSQL(sql, root_ids)
+
+
+def annotate_comments(queryset, user):
+    likes = Comment.like.through.objects.filter(comment=OuterRef("pk"))
+    dislikes = Comment.dislike.through.objects.filter(comment=OuterRef("pk"))
+
+    if user.is_authenticated:
+        liked = Exists(likes.filter(user=user.id))
+        disliked = Exists(dislikes.filter(user=user.id))
+    else:
+        liked = disliked = Value(False, output_field=BooleanField())
+
+    return (
+        queryset.select_related("user", "novel", "chapter__novel")
+        .defer(
+            "novel__description",
+            "chapter__content",
+            "chapter__content_text",
+            "chapter__novel__description",
+        )
+        .annotate(user_liked=liked, user_disliked=disliked)
+    )
+
+
+def serialize_comment(comment, user, replies):
+    return {
+        "id": comment.id,
+        "user": comment.user.username,
+        "image": (
+            comment.user.user_image.url
+            if comment.user.user_image
+            else "/media/placeholder.png"
+        ),
+        "comment": comment.comment,
+        "date": comment.date,
+        "likesCount": comment.likes_count,
+        "dislikesCount": comment.dislikes_count,
+        "liked": comment.user_liked,
+        "disliked": comment.user_disliked,
+        "isAuthor": user == comment.user,
+        "replies": replies,
+        "novel": (
+            {"novel": comment.novel.title, "id": comment.novel.id}
+            if comment.novel
+            else False
+        ),
+        "chapter": (
+            {
+                "chapter": comment.chapter.title,
+                "id": comment.chapter.id,
+                "novel": comment.chapter.novel.title,
+            }
+            if comment.chapter
+            else False
+        ),
+    }
+
+
+def serialize_comment_trees(comments, user):
+    """
+    Serialize top-level comments together with all of their replies.
+
+    Args:
+        comments: A Comment queryset (sliced or not), or a list of comment
+            ids or instances, giving the roots in display order.
+        user: The requesting user, used for liked/disliked/isAuthor.
+
+    Returns:
+        list: ``Comment.serialize``-shaped dicts with nested ``replies``.
+    """
+    root_ids = _ids(comments)
+    if not root_ids:
+        return []
+
+    nodes = list(
+        annotate_comments(
+            Comment.objects.filter(id__in=_descendants_sql(root_ids)), user
+        ).order_by("id")
+    )
+
+    children = {}
+    for node in nodes:
+        children.setdefault(node.parent_comment_id, []).append(node)
+
+    def build(node):
+        return serialize_comment(
+            node, user, [build(child) for child in children.get(node.id, [])]
+        )
+
+    by_id = {node.id: node for node in nodes}
+    return [build(by_id[id]) for id in root_ids if id in by_id]
@@ -0,0 +1,180 @@
+from copy import copy
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from novel import homepage, toc
+from novel.books import book_tag, delete_books
+from novel.caching import invalidate
+from novel.models import Bookmark, Chapter, Comment, Genre, Novel, Rating, Tag
+from novel.normalize import VERSION, normalize_content
+from novel.ratings import apply_rating, rating_values
+from novel.search import update_search_vectors
+from novel.stats import bump_author_stats, novel_author
+from novel.typeahead import record_change
+
+
+@receiver(pre_save, sender=Chapter)
+def chapter_saving(sender, instance, update_fields=None, **kwargs):
+    # A row not converted by compress_chapters gets its content column
+    # written from the legacy one, which is then emptied.
+    if instance.content_text and (
+        update_fields is None or {"content", "content_text"} <= update_fields
+    ):
+        instance.content = instance.content
+        instance.content_text = ""
+
+    # Content that was assigned (or read) since loading is held as text;
+    # untouched content is still the stored bytes and needs no work.
+    content = instance.__dict__.get("content")
+    if isinstance(content, str):
+        instance.content = normalize_content(content)
+        instance.content_version = VERSION
+
+
+@receiver(post_save, sender=Chapter)
+def chapter_saved(sender, instance, created, **kwargs):
+    # After commit, so a rolled back save leaves no entry behind. A copy, as
+    # the instance may still change (or be deleted) before then.
+    chapter = copy(instance)
+    transaction.on_commit(lambda: toc.save_chapter(chapter))
+    invalidate(
+        f"chapter:{instance.pk}",
+        f"novel:{instance.novel_id}",
+        book_tag(instance.novel_id),
+    )
+    if created:
+        homepage.schedule_rebuild()
+
+
+@receiver(post_delete, sender=Chapter)
+def chapter_deleted(sender, instance, **kwargs):
+    # Django clears instance.pk once the delete is done.
+    novel_id, chapter_id = instance.novel_id, instance.pk
+    transaction.on_commit(lambda: toc.delete_chapter(novel_id, chapter_id))
+    invalidate(
+        f"chapter:{instance.pk}",
+        f"novel:{instance.novel_id}",
+        book_tag(instance.novel_id),
+    )
+    homepage.schedule_rebuild()
+    if instance.views:
+        bump_author_stats(novel_author(instance.novel_id), total_views=-instance.views)
+
+
+@receiver(post_save, sender=Novel)
+def novel_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_author_stats(instance.user_id, novel_count=1)
+    update_search_vectors([instance.pk])
+    record_change(instance.pk)
+    invalidate(f"novel:{instance.pk}", book_tag(instance.pk))
+    homepage.schedule_rebuild()
+
+
+@receiver(post_delete, sender=Novel)
+def novel_deleted(sender, instance, **kwargs):
+    bump_author_stats(instance.user_id, novel_count=-1)
+    record_change(instance.pk)
+    invalidate(f"novel:{instance.pk}")
+    delete_books(instance.pk)
+    homepage.schedule_rebuild()
+
+
+def _comment_tags(comment):
+    tags = []
+    if comment.novel_id:
+        tags.append(f"novel:{comment.novel_id}")
+    if comment.chapter_id:
+        tags.append(f"chapter:{comment.chapter_id}")
+        # The novel page shows comments on its chapters too.
+        novel_id = (
+            Chapter.objects.filter(pk=comment.chapter_id)
+            .values_list("novel_id", flat=True)
+            .first()
+        )
+        if novel_id:
+            tags.append(f"novel:{novel_id}")
+    return tags
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    invalidate(*_comment_tags(instance))
+    if created:
+        # The snapshot shows comment counts.
+        homepage.schedule_rebuild()
+        bump_author_stats(instance.user_id, comment_count=1)
+        if instance.novel_id:
+            bump_author_stats(novel_author(instance.novel_id), novel_comments=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    invalidate(*_comment_tags(instance))
+    homepage.schedule_rebuild()
+    bump_author_stats(instance.user_id, comment_count=-1)
+    if instance.novel_id:
+        bump_author_stats(novel_author(instance.novel_id), novel_comments=-1)
+
+
+@receiver(pre_save, sender=Rating)
+def rating_saving(sender, instance, **kwargs):
+    instance._previous = (
+        Rating.objects.filter(pk=instance.pk).values(*rating_values(instance)).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, **kwargs):
+    apply_rating(instance.novel_id, instance._previous, rating_values(instance))
+    invalidate(f"novel:{instance.novel_id}")
+    # The snapshot shows average ratings.
+    homepage.schedule_rebuild()
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    apply_rating(instance.novel_id, rating_values(instance), None)
+    invalidate(f"novel:{instance.novel_id}")
+    homepage.schedule_rebuild()
+
+
+@receiver(post_save, sender=Bookmark)
+@receiver(post_delete, sender=Bookmark)
+def bookmark_changed(sender, instance, **kwargs):
+    # Only library bookmarks are cached; reading positions are kept by
+    # novel.progress.
+    if instance.chapter_id is None:
+        invalidate(f"user:{instance.user_id}")
+
+
+@receiver(m2m_changed, sender=Novel.genres.through)
+@receiver(m2m_changed, sender=Novel.tags.through)
+def novel_labels_changed(sender, instance, action, pk_set, **kwargs):
+    if isinstance(instance, Novel):
+        if action in ("post_add", "post_remove", "post_clear"):
+            update_search_vectors([instance.pk])
+            invalidate(f"novel:{instance.pk}")
+        return
+
+    # Changed from the Tag/Genre side: pk_set holds novel ids, except for
+    # clear(), where the affected novels have to be captured beforehand.
+    if action == "pre_clear":
+        instance._cleared_novels = list(instance.novel.values_list("pk", flat=True))
+    elif action == "post_clear":
+        update_search_vectors(instance._cleared_novels)
+        invalidate(*(f"novel:{pk}" for pk in instance._cleared_novels))
+    elif action in ("post_add", "post_remove"):
+        update_search_vectors(pk_set)
+        invalidate(*(f"novel:{pk}" for pk in pk_set))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Tag)
+def label_saved(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(instance.novel.values_list("pk", flat=True))
@@ -37,30 +37,32 @@ function Comment({userName, image, comment, date, user, likesCount, liked, id, d
     showReplies: false
   });
   
-  const handleLike = (e) => {
-    if (!user) return;
-    e.preventDefault();
-    console.log(id);
-    console.log(e.target);
-    console.log(e.target.name);
-    fetch(`/like/${id}`)
-    .then(r => r.json())
-    .then(d => {
-      load();
-    })
-    .catch(e => console.log(e));
-  };
+  const [reaction, setReaction] = React.useState({liked, disliked, likesCount, dislikesCount});
+
+  React.useEffect(() => {
+    setReaction({liked, disliked, likesCount, dislikesCount});
+  }, [liked, disliked, likesCount, dislikesCount]);
 
-  const handleDislike = (e) => {
+  const react = (e, kind) => {
     if (!user) return;
     e.preventDefault();
-    fetch(`/dislike/${id}`)
+    fetch(`/${kind}/${id}`)
     .then(r => r.json())
     .then(d => {
-      load();
+      if (d.error) return;
+      setReaction({
+        liked: d.liked,
+        disliked: d.disliked,
+        likesCount: d.likesCount,
+        dislikesCount: d.dislikesCount
+      });
     })
     .catch(e => console.log(e));
   };
+
+  const handleLike = e => react(e, 'like');
+
+  const handleDislike = e => react(e, 'dislike');
   
   const submitReply = (e) => {
     e.preventDefault();
@@ -100,13 +102,13 @@ function Comment({userName, image, comment, date, user, likesCount, liked, id, d
         <div className="d-flex mb-2" style={{textAlign: 'right'}}>
           <span>
             <button className="btn btn-link text-decoration-none p-0 btn-sm" onClick={handleLike}>
-              <i className={liked ? "fa fa-thumbs-up" : "far fa-thumbs-up"} aria-hidden="true"></i>
-            </button>{likesCount}
+              <i className={reaction.liked ? "fa fa-thumbs-up" : "far fa-thumbs-up"} aria-hidden="true"></i>
+            </button>{reaction.likesCount}
           </span> ⋅ 
           <span>
             <button className="btn btn-link text-decoration-none p-0 btn-sm" onClick={handleDislike}>
-              <i className={disliked ? "fa fa-thumbs-down" : "far fa-thumbs-down"} aria-hidden="true"></i>
-            </button>{dislikesCount}
+              <i className={reaction.disliked ? "fa fa-thumbs-down" : "far fa-thumbs-down"} aria-hidden="true"></i>
+            </button>{reaction.dislikesCount}
           </span>
         </div>
 
@@ -191,7 +193,9 @@ function App() {
     user: null,
     comments: [],
     currentPage: 1,
-    numOfPages: [],
+    cursor: '',
+    next: null,
+    previous: null,
     page: document.getElementById('page').name,
     id: document.getElementById('page').value,
     text: ""
@@ -223,14 +227,16 @@ function App() {
     });
   };
 
-  const loadComments = (page_nr = state.currentPage) => {
-    fetch(`/comments/${state.page}/${state.id}/${page_nr}`)
+  const loadComments = (cursor = state.cursor) => {
+    fetch(`/comments/${state.page}/${state.id}/1?cursor=${encodeURIComponent(cursor)}`)
     .then(r => r.json())
     .then(d => {
       setState({
         ...state,
         comments: d.comments,
-        numOfPages: d.num,
+        cursor: cursor,
+        next: d.next,
+        previous: d.previous,
         currentPage: d.current,
         user: d.user,
         text: '',
@@ -251,18 +257,19 @@ function App() {
       value={state.text} />
 
       <CommentsList comments={state.comments} load={() => loadComments()}/>
-      {state.numOfPages.length > 1 && <nav aria-label="...">
+      {(state.next || state.previous) && <nav aria-label="...">
         <ul className="pagination justify-content-center">
-          {state.numOfPages.map(p => (
-            <li 
-              className={p === state.currentPage ? 'page-item active disabled' : 'page-item'} 
-              style={{cursor: 'pointer'}}
-              onClick={() => {
-                loadComments(p);
-              }}>
-              <span className="page-link">{p}</span>
-            </li>
-          ))}
+          {state.previous &&
+          <li className="page-item" style={{cursor: 'pointer'}} onClick={() => loadComments(state.previous)}>
+            <span className="page-link">Newer</span>
+          </li>}
+          <li className="page-item active disabled">
+            <span className="page-link">{state.currentPage}</span>
+          </li>
+          {state.next &&
+          <li className="page-item" style={{cursor: 'pointer'}} onClick={() => loadComments(state.next)}>
+            <span className="page-link">Older</span>
+          </li>}
         </ul>
       </nav>}
     </div>
@@ -0,0 +1,48 @@
+document.addEventListener('DOMContentLoaded', () => {
+  const form = document.querySelector('#upload-form');
+  const progress = document.querySelector('#upload-progress');
+  const errors = document.querySelector('#upload-errors');
+
+  form.addEventListener('submit', async event => {
+    event.preventDefault();
+    form.querySelector('button').disabled = true;
+    errors.textContent = '';
+    progress.textContent = 'Uploading...';
+
+    const response = await fetch(form.action || window.location.href, {
+      method: 'POST',
+      body: new FormData(form),
+    });
+    if (!response.headers.get('Content-Type').includes('ndjson')) {
+      // Invalid form: the page was rendered again with its errors.
+      document.open();
+      document.write(await response.text());
+      document.close();
+      return;
+    }
+
+    // The server sends one JSON line per saved batch.
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      for (const line of lines.filter(Boolean)) {
+        const d = JSON.parse(line);
+        if (d.error) {
+          errors.textContent = d.error;
+          progress.textContent = 'Nothing was saved.';
+          form.querySelector('button').disabled = false;
+        } else if (d.done) {
+          window.location.href = d.url;
+        } else {
+          progress.textContent = `Processed ${d.created} chapters...`;
+        }
+      }
+    }
+  });
+});
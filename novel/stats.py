@@ -0,0 +1,86 @@
+"""
+Incrementally maintained author statistics.
+
+``AuthorStats`` rows are adjusted with ``F()`` updates from the signal
+handlers in ``novel.signals`` and from the view-counter flush, so profile
+pages read a single row instead of walking every novel and chapter.
+``rebuild_author_stats`` recomputes them from scratch.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from novel.models import AuthorStats, Chapter, Comment, Novel, User
+
+FIELDS = ["novel_count", "comment_count", "novel_comments", "total_views"]
+
+
+def _aggregate(queryset, field, function):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(value=function)
+            .values("value")[:1]
+        ),
+        0,
+    )
+
+
+def compute_author_stats(user_ids):
+    """
+    Compute AuthorStats rows for the given users from the source tables.
+    """
+    users = User.objects.filter(pk__in=user_ids).annotate(
+        novel_count=_aggregate(Novel.objects, "user", Count("pk")),
+        comment_count=_aggregate(Comment.objects, "user", Count("pk")),
+        novel_comments=_aggregate(Comment.objects, "novel__user", Count("pk")),
+        total_views=_aggregate(Chapter.objects, "novel__user", Sum("views")),
+    )
+    return [
+        AuthorStats(
+            user_id=user.pk, **{field: getattr(user, field) for field in FIELDS}
+        )
+        for user in users
+    ]
+
+
+def rebuild_author_stats(user_ids):
+    stats = compute_author_stats(user_ids)
+    AuthorStats.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=FIELDS,
+    )
+    return stats
+
+
+def get_author_stats(user_id):
+    try:
+        return AuthorStats.objects.get(user_id=user_id)
+    except AuthorStats.DoesNotExist:
+        stats = rebuild_author_stats([user_id])
+        return stats[0] if stats else AuthorStats(user_id=user_id)
+
+
+def bump_author_stats(user_id, **deltas):
+    """
+    Add deltas to a user's stats, e.g. ``bump_author_stats(1, comment_count=1)``.
+
+    Users without a row are skipped; ``get_author_stats`` computes their row
+    from the source tables on first read.
+    """
+    if not user_id:
+        return
+
+    AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def novel_author(novel_id):
+    if not novel_id:
+        return None
+    return Novel.objects.filter(pk=novel_id).values_list("user_id", flat=True).first()
@@ -0,0 +1,78 @@
+"""
+Streaming NDJSON list responses.
+
+``stream_lines`` answers a list API with one JSON object per line, written
+while the rows are read: the queryset is walked with a server-side cursor
+(``KeysetPaginator.rows``) and serialized ``CHUNK_SIZE`` rows at a time, so
+a worker holds one chunk in memory however many rows match. At most
+``MAX_RESULTS`` rows are sent per response; the last line is always
+``{"next": <cursor>}``, where the cursor continues the list (passed back as
+``?cursor=``) or is null when nothing is left.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+MAX_RESULTS = 1000
+CHUNK_SIZE = 100
+
+CONTENT_TYPE = "application/x-ndjson"
+
+
+def json_line(data):
+    return json.dumps(data, cls=DjangoJSONEncoder) + "\n"
+
+
+def result_limit(value):
+    """
+    Parse a ``limit`` query parameter, capped at ``MAX_RESULTS``.
+    """
+    try:
+        return max(1, min(int(value), MAX_RESULTS))
+    except (TypeError, ValueError):
+        return MAX_RESULTS
+
+
+def stream_lines(paginator, serialize, cursor=None, limit=MAX_RESULTS):
+    """
+    Stream the rows of ``paginator`` after ``cursor`` as NDJSON.
+
+    Args:
+        paginator (KeysetPaginator): The list, in its display order.
+        serialize: Callable turning a list of rows into a list of dicts,
+            e.g. ``lambda rows: serialize_novels(rows, user)``.
+        cursor (str): A "next" cursor from a previous response, or None.
+        limit (int): Rows to send at most, capped at ``MAX_RESULTS``.
+
+    Raises:
+        InvalidCursor: Before anything is sent, if ``cursor`` is bad.
+    """
+    rows = paginator.rows(cursor, CHUNK_SIZE)
+    limit = min(limit, MAX_RESULTS)
+
+    def lines():
+        sent = 0
+        chunk = []
+        last = next = None
+        try:
+            for row in rows:
+                if sent == limit:
+                    next = paginator.cursor_after(last)
+                    break
+                chunk.append(row)
+                last = row
+                sent += 1
+                if len(chunk) == CHUNK_SIZE:
+                    yield "".join(json_line(item) for item in serialize(chunk))
+                    chunk = []
+        finally:
+            # Release the server-side cursor as soon as we stop reading.
+            rows.close()
+
+        if chunk:
+            yield "".join(json_line(item) for item in serialize(chunk))
+        yield json_line({"next": next})
+
+    return StreamingHttpResponse(lines(), content_type=CONTENT_TYPE)
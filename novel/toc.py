@@ -0,0 +1,188 @@
+"""
+Per-novel table of contents.
+
+A ``TableOfContents`` keeps (id, num, title, date) for every chapter of a
+novel in parallel arrays sorted by chapter number. It is built once from a
+narrow ``values_list`` query (no chapter content), cached, and then patched
+in place when chapters are created, edited or deleted, so prev/next links
+and chapter lists never have to hit the database.
+
+Builds and patches of a novel's TOC hold the same Redis lock, and patches
+run once the chapter change is committed (see ``novel.signals``). A build
+therefore either reads the change from the database or is patched with it
+afterwards; it can never overwrite a patch with an older list.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from novel.asyncredis import cache_get_many
+
+
+def toc_key(novel_id):
+    return f"toc_{novel_id}"
+
+
+class TableOfContents:
+    __slots__ = ("novel_id", "ids", "nums", "titles", "dates")
+
+    def __init__(self, novel_id, rows=()):
+        self.novel_id = novel_id
+        self.ids = array("q")
+        self.nums = array("q")
+        self.titles = []
+        self.dates = []
+
+        for id, num, title, date in rows:
+            self.ids.append(id)
+            self.nums.append(num)
+            self.titles.append(title)
+            self.dates.append(date)
+
+    @classmethod
+    def build(cls, novel_id):
+        from novel.models import Chapter
+
+        rows = (
+            Chapter.objects.filter(novel_id=novel_id)
+            .order_by("num", "id")
+            .values_list("id", "num", "title", "date")
+        )
+        return cls(novel_id, rows)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._entry(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("table of contents index out of range")
+        return self._entry(index)
+
+    def _entry(self, i):
+        return {
+            "id": self.ids[i],
+            "num": self.nums[i],
+            "title": self.titles[i],
+            "date": self.dates[i],
+        }
+
+    def position(self, chapter_id, num):
+        """
+        Return the index of a chapter, or None if it is not listed.
+
+        Entries are sorted by num, so this is a bisect plus a short scan over
+        chapters sharing the same number.
+        """
+        i = bisect_left(self.nums, num)
+        while i < len(self) and self.nums[i] == num:
+            if self.ids[i] == chapter_id:
+                return i
+            i += 1
+        return None
+
+    def neighbours(self, chapter_id, num):
+        """
+        Return (previous_id, next_id) for a chapter; either may be None.
+        """
+        i = self.position(chapter_id, num)
+        if i is None:
+            return None, None
+
+        previous = self.ids[i - 1] if i > 0 else None
+        next = self.ids[i + 1] if i + 1 < len(self) else None
+        return previous, next
+
+    def insert(self, chapter_id, num, title, date):
+        i = bisect_right(self.nums, num)
+        self.ids.insert(i, chapter_id)
+        self.nums.insert(i, num)
+        self.titles.insert(i, title)
+        self.dates.insert(i, date)
+
+    def remove(self, chapter_id):
+        try:
+            i = self.ids.index(chapter_id)
+        except ValueError:
+            return
+        del self.ids[i]
+        del self.nums[i]
+        del self.titles[i]
+        del self.dates[i]
+
+
+def _lock(novel_id):
+    return cache.lock(f"{toc_key(novel_id)}_lock", timeout=10)
+
+
+def get_toc(novel_id):
+    toc = cache.get(toc_key(novel_id))
+
+    if toc is None:
+        with _lock(novel_id):
+            # Built by another request while this one waited for the lock.
+            toc = cache.get(toc_key(novel_id))
+            if toc is None:
+                toc = TableOfContents.build(novel_id)
+                cache.set(toc_key(novel_id), toc)
+    return toc
+
+
+async def aget_toc(novel_id):
+    toc = (await cache_get_many([toc_key(novel_id)])).get(toc_key(novel_id))
+    if toc is None:
+        toc = await sync_to_async(get_toc)(novel_id)
+    return toc
+
+
+def _patch(novel_id, change):
+    # Only patch a TOC that is already cached; a missing one is built from
+    # the database, where the change is already committed, on the next read.
+    with _lock(novel_id):
+        toc = cache.get(toc_key(novel_id))
+        if toc is None:
+            return
+        change(toc)
+        cache.set(toc_key(novel_id), toc)
+
+
+def save_chapter(chapter):
+    """
+    Insert or move a chapter in its novel's cached table of contents.
+    """
+
+    def change(toc):
+        toc.remove(chapter.id)
+        toc.insert(chapter.id, chapter.num, chapter.title, chapter.date)
+
+    _patch(chapter.novel_id, change)
+
+
+def save_chapters(chapters):
+    """
+    Insert newly created chapters of one novel in a single patch.
+    """
+    if not chapters:
+        return
+
+    def change(toc):
+        # A TOC built after the chapters were committed already lists them.
+        listed = set(toc.ids)
+        for chapter in chapters:
+            if chapter.id not in listed:
+                toc.insert(chapter.id, chapter.num, chapter.title, chapter.date)
+
+    _patch(chapters[0].novel_id, change)
+
+
+def delete_chapter(novel_id, chapter_id):
+    """
+    Drop a chapter from its novel's cached table of contents.
+    """
+    _patch(novel_id, lambda toc: toc.remove(chapter_id))
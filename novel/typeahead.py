@@ -0,0 +1,222 @@
+"""
+In-memory prefix index for the search box.
+
+Each worker process keeps a sorted list of (normalized key, novel id)
+pairs, where the keys are every word-suffix of a novel's title ("the red
+king", "red king", "king") and its author's name. A lookup is a bisect to
+the first key starting with the prefix followed by a scan of that range, so
+answering a keystroke never touches the database.
+
+Novel saves and deletes are appended to a Redis stream; workers replay the
+stream at most once per ``SYNC_INTERVAL`` and reload only the novels that
+changed. The whole index is rebuilt every ``REBUILD_INTERVAL`` to pick up
+popularity (view count) changes and author renames; the new index is
+loaded by one thread without holding the index lock while the others keep
+answering from the old one, and swapped in when it is complete.
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django_redis import get_redis_connection
+
+from novel.models import Novel
+
+STREAM_KEY = "genesis:typeahead:changes"
+STREAM_LENGTH = 1000
+
+SYNC_INTERVAL = 1
+REBUILD_INTERVAL = 600
+
+# Results for prefixes up to this length are memoized until the next change;
+# they match the most keys and are the slowest to rank. The least recently
+# used are dropped past MEMO_SIZE, as prefixes come from user input.
+MEMO_PREFIX_LENGTH = 3
+MEMO_SIZE = 1024
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+def _keys(title, author):
+    words = normalize(title).split()
+    keys = {" ".join(words[i:]) for i in range(len(words))}
+    if author:
+        keys.add(normalize(author))
+    keys.discard("")
+    return keys
+
+
+def _stream_id(id):
+    if isinstance(id, bytes):
+        id = id.decode()
+    ms, seq = id.split("-")
+    return int(ms), int(seq)
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.entries = []
+        self.novels = {}
+        self.memo = OrderedDict()
+        # Held while the index is read or patched.
+        self.lock = threading.Lock()
+        # Held by the thread loading a new index.
+        self.rebuilding = threading.Lock()
+        # Set when the change stream lost entries the index has not seen.
+        self.stale = False
+        self.last_change = None
+        self.built_at = 0
+        self.synced_at = 0
+
+    def _rows(self, queryset):
+        return queryset.values_list("id", "title", "views", "user__username")
+
+    def _add(self, id, title, views, author):
+        keys = _keys(title, author)
+        self.novels[id] = (title, views, keys)
+        for key in keys:
+            insort(self.entries, (key, id))
+
+    def _remove(self, id):
+        if id not in self.novels:
+            return
+        _, _, keys = self.novels.pop(id)
+        for key in keys:
+            i = bisect_left(self.entries, (key, id))
+            if i < len(self.entries) and self.entries[i] == (key, id):
+                del self.entries[i]
+
+    def rebuild(self):
+        """
+        Load a new index from the database and swap it in. Only the swap
+        holds ``self.lock``.
+        """
+        redis = get_redis_connection("default")
+        # Read the stream position before the database so changes committed
+        # during the rebuild are replayed rather than lost.
+        latest = redis.xrevrange(STREAM_KEY, count=1)
+
+        novels = {}
+        entries = []
+        for id, title, views, author in self._rows(Novel.objects.all()):
+            keys = _keys(title, author)
+            novels[id] = (title, views, keys)
+            entries.extend((key, id) for key in keys)
+        entries.sort()
+
+        with self.lock:
+            self.novels = novels
+            self.entries = entries
+            self.memo = OrderedDict()
+            self.stale = False
+            self.last_change = _stream_id(latest[0][0]) if latest else (0, 0)
+            self.built_at = self.synced_at = time.monotonic()
+
+    def _expired(self):
+        return (
+            not self.built_at
+            or self.stale
+            or time.monotonic() - self.built_at > REBUILD_INTERVAL
+        )
+
+    def sync(self):
+        if self._expired():
+            # Only the first build is waited for; during later ones the old
+            # index keeps answering and is still patched below.
+            if self.rebuilding.acquire(blocking=not self.built_at):
+                try:
+                    # Another thread may have rebuilt it while this one
+                    # waited.
+                    if self._expired():
+                        self.rebuild()
+                        return
+                finally:
+                    self.rebuilding.release()
+
+        with self.lock:
+            self._apply_changes()
+
+    def _apply_changes(self):
+        now = time.monotonic()
+        if now - self.synced_at < SYNC_INTERVAL:
+            return
+        self.synced_at = now
+
+        redis = get_redis_connection("default")
+        ms, seq = self.last_change
+        changes = redis.xrange(STREAM_KEY, min=f"{ms}-{seq + 1}", max="+")
+        if not changes:
+            return
+
+        # The stream is trimmed from the front once full; if the last entry
+        # we applied is gone, entries after it may be gone too.
+        if redis.xlen(STREAM_KEY) >= STREAM_LENGTH:
+            first = redis.xrange(STREAM_KEY, count=1)
+            if first and _stream_id(first[0][0]) > (ms, seq):
+                self.stale = True
+                return
+
+        ids = {int(fields[b"novel"]) for _, fields in changes}
+        for id in ids:
+            self._remove(id)
+        for row in self._rows(Novel.objects.filter(pk__in=ids)):
+            self._add(*row)
+
+        self.memo = OrderedDict()
+        self.last_change = _stream_id(changes[-1][0])
+
+    def search(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        memo_key = (prefix, limit)
+        if memo_key in self.memo:
+            self.memo.move_to_end(memo_key)
+            return self.memo[memo_key]
+
+        ids = set()
+        i = bisect_left(self.entries, (prefix,))
+        while i < len(self.entries) and self.entries[i][0].startswith(prefix):
+            ids.add(self.entries[i][1])
+            i += 1
+
+        top = heapq.nlargest(limit, ids, key=lambda id: (self.novels[id][1], -id))
+        results = [{"id": id, "title": self.novels[id][0]} for id in top]
+
+        if len(prefix) <= MEMO_PREFIX_LENGTH:
+            self.memo[memo_key] = results
+            if len(self.memo) > MEMO_SIZE:
+                self.memo.popitem(last=False)
+        return results
+
+
+index = PrefixIndex()
+
+
+def suggest(prefix, limit=8):
+    """
+    Return up to ``limit`` {"id", "title"} dicts for novels whose title
+    words or author start with ``prefix``, most viewed first.
+    """
+    index.sync()
+    with index.lock:
+        return index.search(prefix, limit)
+
+
+def record_change(novel_id):
+    """
+    Tell every worker's index that a novel was created, renamed or deleted.
+    """
+    get_redis_connection("default").xadd(
+        STREAM_KEY, {"novel": novel_id}, maxlen=STREAM_LENGTH, approximate=False
+    )
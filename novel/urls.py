@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI (settings.ASYNC_VIEWS) the hot read pages use their async views.
+novel_view = views.anovel if settings.ASYNC_VIEWS else views.novel
+chapter_view = views.achapter if settings.ASYNC_VIEWS else views.chapter
+
 urlpatterns = [
     path("", views.index, name="index"),
     path("login", views.login_view, name="login"),
@@ -17,13 +22,17 @@ urlpatterns = [
     path("editcomments/<int:id>", views.edit_comments, name="editcomments"),
     path("novels/<str:order>/<int:page_nr>", views.novels_view, name="novels"),
     path("chapters/<int:id>/<int:page_nr>", views.chapters_view, name="chapters"),
-    path("novel/<int:id>", views.novel, name="novel"),
-    path("chapter/<int:id>", views.chapter, name="chapter"),
+    path("novel/<int:id>", novel_view, name="novel"),
+    path("chapter/<int:id>", chapter_view, name="chapter"),
     path("search/<int:page_nr>", views.search, name="search"),
+    path("autocomplete", views.autocomplete, name="autocomplete"),
     path("reply/<int:id>", views.reply, name="reply"),
     path("bookmark/<int:id>", views.bookmark, name="bookmark"),
     path("create_novel", views.create_novel, name="create_novel"),
     path("create_chapter/<int:id>", views.create_chapter, name="create_chapter"),
+    path("upload_chapters/<int:id>", views.upload_chapters, name="upload_chapters"),
+    path("import_epub", views.import_epub, name="import_epub"),
+    path("download/<int:id>.epub", views.download, name="download"),
     path("profile/<str:username>", views.profile, name="profile"),
     path("edit_profile", views.edit_profile, name="edit_profile"),
     path("bookmarks", views.bookmarks, name="bookmarks"),
@@ -1,18 +1,81 @@
+import asyncio
 import json
+import logging
 from django.contrib.auth import PermissionDenied, authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import EmptyPage, Paginator
-from django.db import IntegrityError
-from django.http import HttpResponseRedirect, JsonResponse
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
 from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import csrf_exempt
-from novel.models import Bookmark, Comment, User, Novel, Chapter, Rating
-from novel.forms import NewNovelForm, NewChapterForm, EditProfileForm
+from novel.models import (
+    Bookmark,
+    Comment,
+    User,
+    Novel,
+    Chapter,
+    Rating,
+    RatingAggregate,
+)
+from novel.books import RETRY_AFTER, BuildFailed, get_book, serve_book
+from novel.caching import cached
+from novel.conditional import (
+    apage_etag,
+    apage_modified,
+    arespond,
+    page_etag,
+    page_modified,
+    respond,
+)
+from novel.counters import (
+    apending_chapter_views,
+    apending_novel_views,
+    arecord_view,
+    pending_chapter_views,
+    pending_novel_views,
+    record_view,
+)
+from novel.epub import EpubBook, novel_from_book
+from novel.homepage import get_snapshot, personalize
+from novel.ingest import IngestError, ingest_chapters, parse_upload
+from novel.pagination import InvalidCursor, KeysetPaginator
+from novel.progress import alast_read, arecord_progress, last_read, record_progress
+from novel.reactions import toggle_reaction
+from novel.records import aget_chapter, aget_novel, get_chapter, get_novel
+from novel.search import search_novels
+from novel.serializers import (
+    aserialize_novels,
+    serialize_comment_trees,
+    serialize_novels,
+)
+from novel.streaming import (
+    CHUNK_SIZE,
+    CONTENT_TYPE,
+    json_line,
+    result_limit,
+    stream_lines,
+)
+from novel.toc import aget_toc, get_toc
+from novel.typeahead import suggest
+from novel.forms import (
+    NewNovelForm,
+    NewChapterForm,
+    EditProfileForm,
+    UploadChaptersForm,
+    ImportEpubForm,
+)
 from novel.helpers import text_to_html, html_to_text
 from statistics import fmean
-from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of novels returned by the JSON search endpoint.
+SEARCH_RESULTS = 20
+
+# Sort fields accepted by the novels list.
+NOVEL_ORDERS = ["id", "title", "views", "date"]
 
 
 @login_required
@@ -32,9 +95,6 @@ def rating(request, id):
     novel = get_object_or_404(Novel, pk=id)
 
     if request.method == "POST" and request.user.is_authenticated:
-        if any(i.user == request.user for i in novel.novel_ratings.all()):
-            return JsonResponse({"error": "Already made a rating"}, status=403)
-
         data = json.loads(request.body)
 
         story = int(data.get("story", False))
@@ -44,83 +104,39 @@ def rating(request, id):
 
         if all([story, characters, world, writing]):
             try:
-                rating = Rating(
-                    novel=novel,
-                    user=request.user,
-                    story=story,
-                    characters=characters,
-                    world=world,
-                    writing=writing,
-                    average_rating=fmean([story, characters, world, writing]),
-                )
-                rating.save()
+                with transaction.atomic():
+                    Rating.objects.create(
+                        novel=novel,
+                        user=request.user,
+                        story=story,
+                        characters=characters,
+                        world=world,
+                        writing=writing,
+                        average_rating=fmean([story, characters, world, writing]),
+                    )
+            except IntegrityError:
+                return JsonResponse({"error": "Already made a rating"}, status=403)
             except Exception:
                 return JsonResponse(
                     {"error": "One of the fields is incorrect"}, status=403
                 )
             return JsonResponse(
                 {
-                    "story": fmean(
-                        [rating.story for rating in novel.novel_ratings.all()]
-                    ),
-                    "characters": fmean(
-                        [rating.characters for rating in novel.novel_ratings.all()]
-                    ),
-                    "world": fmean(
-                        [rating.world for rating in novel.novel_ratings.all()]
-                    ),
-                    "writing": fmean(
-                        [rating.writing for rating in novel.novel_ratings.all()]
-                    ),
-                    "average": fmean(
-                        [rating.average_rating for rating in novel.novel_ratings.all()]
-                    ),
+                    **RatingAggregate.objects.get(novel=novel).serialize(),
                     "madeRating": True,
-                    "count": novel.novel_ratings.count(),
                 }
             )
 
         else:
             return JsonResponse({"error": "Invalid Form"}, status=403)
 
-    if len(novel.novel_ratings.all()) > 0:
+    aggregate = RatingAggregate.objects.filter(novel=novel, count__gt=0).first()
+    if aggregate:
         return JsonResponse(
             {
-                "story": fmean(
-                    [
-                        rating.story if rating else 0
-                        for rating in novel.novel_ratings.all()
-                    ]
-                ),
-                "characters": fmean(
-                    [
-                        rating.characters if rating else 0
-                        for rating in novel.novel_ratings.all()
-                    ]
-                ),
-                "world": fmean(
-                    [
-                        rating.world if rating else 0
-                        for rating in novel.novel_ratings.all()
-                    ]
-                ),
-                "writing": fmean(
-                    [
-                        rating.writing if rating else 0
-                        for rating in novel.novel_ratings.all()
-                    ]
-                ),
-                "average": fmean(
-                    [
-                        rating.average_rating if rating else 0
-                        for rating in novel.novel_ratings.all()
-                    ]
-                ),
-                "madeRating": any(
-                    i.user == request.user for i in novel.novel_ratings.all()
-                )
-                or not request.user.is_authenticated,
-                "count": novel.novel_ratings.count(),
+                **aggregate.serialize(),
+                "madeRating": not request.user.is_authenticated
+                or Rating.objects.filter(user=request.user, novel=novel).exists(),
             }
         )
     return JsonResponse(
@@ -166,7 +182,7 @@ def profile(request, username):
             "novel/profile.html",
             {
                 "profile_user": user.serialize(request.user),
-                "novels": [novel.serialize(request.user) for novel in novels],
+                "novels": serialize_novels(novels, request.user),
                 "is_own_profile": request.user == user,
             },
         )
@@ -236,18 +252,19 @@ def edit_profile(request):
 
 @login_required
 def bookmarks(request):
-    novels = cache.get(f"bookmarks_{request.user.id}")
-    
-    if not novels:
-        print("here")
-        bookmarks = Bookmark.objects.filter(user=request.user, chapter=None)
-        novels = [bookmark.novel for bookmark in bookmarks]
-        
-        cache.set(f"bookmarks_{request.user.id}", novels)
+    novels = cached(
+        f"bookmarks_{request.user.id}",
+        lambda: list(
+            Bookmark.objects.filter(user=request.user, chapter=None).values_list(
+                "novel_id", flat=True
+            )
+        ),
+        tags=[f"user:{request.user.id}"],
+    )
     return render(
         request,
         "novel/bookmarks.html",
-        {"novels": [novel.serialize(request.user) for novel in novels]},
+        {"novels": serialize_novels(novels, request.user)},
     )
 
 
@@ -269,7 +286,6 @@ def create_chapter(request, id):
                 novel=novel,
             )
             chapter.save()
-            cache.delete(f"chapters_{id}")
 
             return HttpResponseRedirect(reverse("chapter", kwargs={"id": chapter.id}))
 
@@ -283,6 +299,50 @@ def create_chapter(request, id):
     return render(request, "novel/create_chapter.html", {"form": NewChapterForm()})
 
 
+@login_required
+def upload_chapters(request, id):
+    novel = get_object_or_404(Novel, pk=id)
+    if novel.user != request.user:
+        raise PermissionDenied
+
+    form = UploadChaptersForm(request.POST or None, request.FILES or None)
+    if request.method != "POST" or not form.is_valid():
+        return render(
+            request,
+            "novel/upload_chapters.html",
+            {
+                "form": form,
+                "heading": f"Upload Chapters to {novel.title}",
+                "errors": form.errors,
+            },
+        )
+
+    upload = form.cleaned_data["file"]
+
+    def progress():
+        # One line per batch so large uploads can show progress.
+        try:
+            for created in ingest_chapters(
+                novel,
+                parse_upload(upload, upload.name),
+                form.cleaned_data["start"],
+            ):
+                yield json_line({"created": created})
+        except IngestError as e:
+            yield json_line({"error": str(e)})
+            return
+        except Exception:
+            # The 200 is already sent; end the stream with an error line.
+            logger.exception("Uploading chapters to novel %s failed", id)
+            yield json_line({"error": "The upload could not be processed"})
+            return
+        yield json_line(
+            {"done": True, "url": reverse("chapters", kwargs={"id": id, "page_nr": 1})}
+        )
+
+    return StreamingHttpResponse(progress(), content_type=CONTENT_TYPE)
+
+
 @csrf_exempt
 @login_required
 def edit_chapter(request, id):
@@ -300,8 +360,6 @@ def edit_chapter(request, id):
             chapter.content = text_to_html(form.cleaned_data["content"])
 
             chapter.save()
-            cache.delete(f"chapters_{chapter.novel.id}")
-            cache.delete(f"chapter_{chapter.id}")
             return HttpResponseRedirect(reverse("chapter", kwargs={"id": chapter.id}))
 
         else:
@@ -359,7 +417,6 @@ def create_novel(request):
             novel.save()
             novel.genres.set(genres)
             novel.save()
-            cache.delete("novels")
             return HttpResponseRedirect(reverse("novel", kwargs={"id": novel.id}))
         else:
             return render(
@@ -370,6 +427,46 @@ def create_novel(request):
     return render(request, "novel/create_novel.html", {"form": NewNovelForm()})
 
 
+@login_required
+def import_epub(request):
+    form = ImportEpubForm(request.POST or None, request.FILES or None)
+    if request.method != "POST" or not form.is_valid():
+        return render(
+            request,
+            "novel/upload_chapters.html",
+            {"form": form, "heading": "Import EPUB", "errors": form.errors},
+        )
+
+    upload = form.cleaned_data["file"]
+
+    def progress():
+        # Same protocol as upload_chapters; the novel is only kept if all of
+        # its chapters are.
+        book = None
+        try:
+            book = EpubBook(upload)
+            with transaction.atomic():
+                novel = novel_from_book(book, request.user)
+                novel.genres.set(form.cleaned_data["genres"])
+                for created in ingest_chapters(novel, book.chapters()):
+                    yield json_line({"created": created})
+        except IngestError as e:
+            yield json_line({"error": str(e)})
+            return
+        except Exception:
+            logger.exception("Importing %s failed", upload.name)
+            yield json_line({"error": "The book could not be imported"})
+            return
+        finally:
+            if book:
+                book.close()
+        yield json_line(
+            {"done": True, "url": reverse("novel", kwargs={"id": novel.id})}
+        )
+
+    return StreamingHttpResponse(progress(), content_type=CONTENT_TYPE)
+
+
 @csrf_exempt
 @login_required
 def edit_novel(request, id):
@@ -398,7 +495,6 @@ def edit_novel(request, id):
                 novel.genres.clear()
                 novel.genres.set(genres)
             novel.save()
-            cache.delete(f"novel_{id}")
             return HttpResponseRedirect(reverse("novel", kwargs={"id": id}))
         else:
             return render(
@@ -434,22 +530,25 @@ def edit_novel(request, id):
 
 def search(request, page_nr=0):
     query = request.GET.get("q")
+    novels = search_novels(query)
 
-    try:
-        novels = cache.get("novels")
-        if not novels:
-            raise Exception
-
-        novels = novels.filter(title__icontains=query)
-
-    except Exception:
-        novels = Novel.objects.filter(title__icontains=query)
+    if request.GET.get("format") == "ndjson":
+        try:
+            return stream_lines(
+                KeysetPaginator(novels.only("id", "views"), CHUNK_SIZE),
+                lambda rows: serialize_novels(rows, request.user),
+                request.GET.get("cursor"),
+                result_limit(request.GET.get("limit")),
+            )
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
 
     if page_nr > 0:
         try:
-            c = Paginator(novels, 10)
-            current_novels = c.page(page_nr)
-        except Exception:
+            current_novels = KeysetPaginator(novels, 10).page(
+                request.GET.get("cursor"), page_nr
+            )
+        except InvalidCursor:
             return HttpResponseRedirect(reverse("index"))
 
         return render(
@@ -457,21 +556,25 @@ def search(request, page_nr=0):
             "novel/search.html",
             {
                 "query": query,
-                "num": [i for i in range(1, c.num_pages + 1)],
-                "current": page_nr,
-                "novels": [
-                    novel.serialize(request.user)
-                    for novel in current_novels.object_list
-                ],
-                "last": c.num_pages,
+                "page": current_novels,
+                "novels": serialize_novels(current_novels.object_list, request.user),
             },
         )
 
     return JsonResponse(
-        [novel.serialize(request.user) for novel in novels], status=200, safe=False
+        serialize_novels(novels[:SEARCH_RESULTS], request.user), status=200, safe=False
     )
 
 
+def autocomplete(request):
+    try:
+        limit = min(int(request.GET.get("limit", 8)), 20)
+    except ValueError:
+        limit = 8
+
+    return JsonResponse(suggest(request.GET.get("q", ""), limit), safe=False)
+
+
 @csrf_exempt
 @login_required(redirect_field_name=None, login_url="/login")
 def compose(request, page):
@@ -532,11 +635,40 @@ def reply(request, id):
 
 def comments(request, view, page_id, page_nr):
     comments = (
-        Comment.objects.filter(novel=Novel.objects.get(pk=page_id))
+        Comment.objects.filter(novel_id=page_id)
         if view == "novel"
-        else Comment.objects.filter(chapter=Chapter.objects.get(pk=page_id))
+        else Comment.objects.filter(chapter_id=page_id)
     )
 
+    if request.GET.get("format") == "ndjson":
+        try:
+            return stream_lines(
+                KeysetPaginator(comments.only("id"), CHUNK_SIZE, ["-id"]),
+                lambda rows: serialize_comment_trees(rows, request.user),
+                request.GET.get("cursor"),
+                result_limit(request.GET.get("limit")),
+            )
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    if "cursor" in request.GET:
+        try:
+            page = KeysetPaginator(comments, 10, ["-id"]).page(
+                request.GET["cursor"], page_nr
+            )
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+        return JsonResponse(
+            {
+                "current": page.number,
+                "next": page.next,
+                "previous": page.previous,
+                "comments": serialize_comment_trees(page.object_list, request.user),
+                "user": True if request.user.username else False,
+            }
+        )
+
     c = Paginator(comments.order_by("-id"), 10)
     current_comments = c.page(page_nr)
 
@@ -544,10 +676,9 @@ def comments(request, view, page_id, page_nr):
         {
             "num": [i for i in range(1, c.num_pages + 1)],
             "current": page_nr,
-            "comments": [
-                comment.serialize(request.user)
-                for comment in current_comments.object_list
-            ],
+            "comments": serialize_comment_trees(
+                current_comments.object_list, request.user
+            ),
             "user": True if request.user.username else False,
         },
         safe=False,
@@ -555,33 +686,27 @@ def comments(request, view, page_id, page_nr):
 
 
 def like(request, id):
-    comment = get_object_or_404(Comment, pk=id)
     if not request.user.is_authenticated:
         return JsonResponse({"error": "User not login"}, status=400)
 
-    if request.user in comment.like.all():
-        comment.like.remove(request.user)
-    else:
-        if request.user in comment.dislike.all():
-            comment.dislike.remove(request.user)
-        comment.like.add(request.user)
-
-    return JsonResponse({"message": "Like has been removed/added"})
+    return JsonResponse(
+        {
+            "message": "Like has been removed/added",
+            **toggle_reaction(id, request.user, "like"),
+        }
+    )
 
 
 def dislike(request, id):
-    comment = get_object_or_404(Comment, pk=id)
     if not request.user.is_authenticated:
         return JsonResponse({"error": "User not login"}, status=400)
 
-    if request.user in comment.dislike.all():
-        comment.dislike.remove(request.user)
-    else:
-        if request.user in comment.like.all():
-            comment.like.remove(request.user)
-        comment.dislike.add(request.user)
-
-    return JsonResponse({"message": "Dislike has been removed/added"})
+    return JsonResponse(
+        {
+            "message": "Dislike has been removed/added",
+            **toggle_reaction(id, request.user, "dislike"),
+        }
+    )
 
 
 def edit_comments(request, id):
@@ -615,227 +740,251 @@ def bookmark(request, id):
     if not request.user.is_authenticated:
         return JsonResponse({"error": "User must login"}, status=400)
     try:
-        novel = Bookmark.objects.get(novel=id, user=request.user, chapter=None).novel
-        novel.delete()
-        
-        cache.delete(f"bookmarks_{request.user.id}")
+        Bookmark.objects.get(novel=id, user=request.user, chapter=None).delete()
         return JsonResponse({"message": "Removed"}, status=200)
     except Bookmark.DoesNotExist:
         bookmark = Bookmark(user=request.user, novel=get_object_or_404(Novel, pk=id))
-        
         bookmark.save()
         return JsonResponse({"message": "Added"}, status=200)
 
 
 def index(request):
-    lastest = cache.get("lastest")
-    popular = cache.get("popular")
-    chapters = cache.get("lastest_chapters")
-    novels = cache.get("novels")
-
-    if not lastest or not popular or not chapters or not novels:
-        novels = Novel.objects.all()
-        lastest = [
-            novel.serialize(request.user) for novel in novels.order_by("-date")[:9]
-        ]
-        popular = [
-            novel.serialize(request.user) for novel in novels.order_by("-views")[:9]
-        ]
-        chapters = [
-            chapter.serialize()
-            for chapter in Chapter.objects.all().order_by("-id")[:10]
-        ]
-        cache.set("novels", novels)
-        cache.set("lastest", lastest)
-        cache.set("popular", popular)
-        cache.set("lastest_chapters", chapters)
+    snapshot = personalize(get_snapshot(), request.user)
     return render(
         request,
         "novel/index.html",
         {
-            "recent_chapters": chapters,
-            "lastest": lastest,
-            "popular": popular,
+            "recent_chapters": snapshot["chapters"],
+            "lastest": snapshot["latest"],
+            "popular": snapshot["popular"],
         },
     )
 
 
 def novels_view(request, order, page_nr):
-    try:
-        novels = cache.get("novels")
-
-        if not novels:
-            novels = Novel.objects.all()
-            print("here")
-            cache.set("novels", novels)
+    field = order.lstrip("-")
+    if field not in NOVEL_ORDERS:
+        return HttpResponseRedirect(reverse(index))
 
-        if "title" not in order:
-            novels = novels.order_by(order)
-        n = Paginator(novels, 10)
-        current_novels = n.page(page_nr)
+    # id breaks ties so every row has a unique position for the cursor.
+    ordering = [order] if field == "id" else [order, "-id"]
 
-        return render(
-            request,
-            "novel/novels.html",
-            {
-                "novels": [
-                    novel.serialize(request.user)
-                    for novel in current_novels.object_list
-                ],
-                "num": [i for i in range(1, n.num_pages + 1) if abs(i - page_nr) < 5],
-                "last": n.num_pages,
-                "title": f"Novels | Page {page_nr}  ",
-                "current": page_nr,
-                "order": order,
-            },
+    try:
+        current_novels = KeysetPaginator(Novel.objects.all(), 10, ordering).page(
+            request.GET.get("cursor"), page_nr
         )
+    except InvalidCursor:
+        return HttpResponseRedirect(reverse(index))
 
-    except EmptyPage:
+    if not current_novels.object_list and current_novels.number > 1:
         return HttpResponseRedirect(reverse(index))
 
+    return render(
+        request,
+        "novel/novels.html",
+        {
+            "novels": serialize_novels(current_novels.object_list, request.user),
+            "page": current_novels,
+            "title": f"Novels | Page {current_novels.number}  ",
+            "order": order,
+        },
+    )
+
 
 def chapters_view(request, id, page_nr):
-    try:
-        n = cache.get(f"novel_{id}")
-        chapters = cache.get(f"chapters_{id}")
-
-        if not chapters or not n:
-            n = get_object_or_404(Novel, pk=id)
-            chapters = Chapter.objects.filter(novel=n)
+    def render_page():
+        try:
+            n = get_novel(id)
 
-            cache.set(f"novel_{id}", n)
-            cache.set(f"chapters_{id}", chapters)
+            c = Paginator(get_toc(id), 100)
+            current_chapters = c.page(page_nr)
 
-        c = Paginator(chapters, 100)
-        current_chapters = c.page(page_nr)
+            return render(
+                request,
+                "novel/chapters.html",
+                {
+                    "title": f"{n.title} | Page {page_nr}",
+                    "chapters": current_chapters.object_list,
+                    "last": c.num_pages,
+                    "current": page_nr,
+                    "num": [
+                        i for i in range(1, c.num_pages + 1) if abs(i - page_nr) < 5
+                    ],
+                    "id": id,
+                    "name": n.title,
+                    "is_author": n.user == request.user,
+                },
+            )
+        except EmptyPage:
+            return HttpResponseRedirect(reverse("novel", kwargs={"id": id}))
 
-        return render(
-            request,
-            "novel/chapters.html",
-            {
-                "title": f"{n.title} | Page {page_nr}",
-                "chapters": [
-                    chapter.serialize() for chapter in current_chapters.object_list
-                ],
-                "last": c.num_pages,
-                "current": page_nr,
-                "num": [i for i in range(1, c.num_pages + 1) if abs(i - page_nr) < 5],
-                "id": id,
-                "name": n.title,
-                "is_author": n.user == request.user,
-            },
-        )
-    except EmptyPage:
-        return HttpResponseRedirect(reverse(novel, kwargs={"id": id}))
+    tags = [f"novel:{id}"]
+    return respond(
+        request,
+        page_etag(request, tags),
+        render_page,
+        page_modified(request.user, tags),
+    )
 
 
 def novel(request, id):
-    novel = cache.get(f"novel_{id}")
-    chapters = cache.get(f"chapters_{id}")
-    rating = cache.get(f"rating_{id}")
-
-    if not novel or not chapters:
-        novel = get_object_or_404(Novel, pk=id)
-        chapters = Chapter.objects.filter(novel=novel)
+    tags = [f"novel:{id}"]
+    last_chapter = None
+    if request.user.is_authenticated:
+        tags.append(f"user:{request.user.id}")
+        last_chapter = last_read(request.user.id, id)
 
-        cache.set(f"novel_{id}", novel)
-        cache.set(f"chapters_{id}", chapters)
+    return respond(
+        request,
+        page_etag(request, tags, last_chapter),
+        lambda: render_novel(request, id, last_chapter),
+        page_modified(request.user, tags),
+    )
 
-    chapters = chapters[:20]
 
-    if len(novel.novel_ratings.all()) > 0 and not rating:
-        rating = {
-            "story": fmean(
-                [
-                    rating.story if rating.story else 0
-                    for rating in novel.novel_ratings.all()
-                ]
-            ),
-            "characters": fmean(
-                [
-                    rating.characters if rating.characters else 0
-                    for rating in novel.novel_ratings.all()
-                ]
-            ),
-            "world": fmean(
-                [
-                    rating.world if rating.world else 0
-                    for rating in novel.novel_ratings.all()
-                ]
-            ),
-            "writing": fmean(
-                [
-                    rating.writing if rating.writing else 0
-                    for rating in novel.novel_ratings.all()
-                ]
-            ),
-            "average": fmean(
-                [
-                    rating.average_rating if rating.average_rating else 0
-                    for rating in novel.novel_ratings.all()
-                ]
-            ),
-        }
-        cache.set(f"rating_{id}", rating, 300)
+def render_novel(request, id, last_chapter):
+    novel = get_novel(id)
+    serialized = novel.serialize(request.user)
+    serialized["views"] += pending_novel_views([novel.id])[novel.id]
+    return render_novel_page(
+        request,
+        serialized,
+        get_toc(id),
+        RatingAggregate.objects.filter(novel_id=id).first(),
+        request.user.is_authenticated
+        and Bookmark.objects.filter(
+            user=request.user, novel=novel, chapter=None
+        ).exists(),
+        last_chapter,
+    )
 
-    print(novel.novel_ratings.all())
 
+async def anovel(request, id):
+    user = request.user = await request.auser()
+    tags = [f"novel:{id}"]
     last_chapter = None
+    if user.is_authenticated:
+        tags.append(f"user:{user.id}")
+        last_chapter = await alast_read(user.id, id)
+
+    async def bookmarked():
+        return (
+            user.is_authenticated
+            and await Bookmark.objects.filter(
+                user=user, novel_id=id, chapter=None
+            ).aexists()
+        )
 
-    if request.user.is_authenticated:
-        try:
-            b = Bookmark.objects.get(user=request.user, novel=novel, chapter__isnull=False)
-            last_chapter = b.chapter.id if b else None
+    async def render_page():
+        novel, serialized, toc, aggregate, bookmark, pending = await asyncio.gather(
+            aget_novel(id),
+            aserialize_novels([id], user),
+            aget_toc(id),
+            RatingAggregate.objects.filter(novel_id=id).afirst(),
+            bookmarked(),
+            apending_novel_views([id]),
+        )
+        serialized = serialized[0]
+        serialized["views"] += pending[id]
+        return render_novel_page(
+            request, serialized, toc, aggregate, bookmark, last_chapter
+        )
 
-        except Exception:
-            pass
+    etag, last_modified = await asyncio.gather(
+        apage_etag(user, tags, last_chapter), apage_modified(user, tags)
+    )
+    return await arespond(request, user, etag, render_page, last_modified)
+
+
+def render_novel_page(request, serialized, toc, aggregate, bookmark, last_chapter):
+    chapters = toc[:20]
     return render(
         request,
         "novel/novel.html",
         {
-            "novel": novel.serialize(request.user),
-            "chapters": [chapter.serialize() for chapter in chapters],
-            "chapter_id": chapters[0].id if chapters else 0,
-            "bookmark": (
-                True if Bookmark.objects.filter(user=request.user, novel=novel, chapter=None) else False
-            ),
+            "novel": serialized,
+            "chapters": chapters,
+            "chapter_id": chapters[0]["id"] if chapters else 0,
+            "bookmark": bookmark,
             "last_chapter": last_chapter,
-            "rating": rating if len(novel.novel_ratings.all()) > 0 else {},
+            "rating": (aggregate.serialize() if aggregate and aggregate.count else {}),
         },
     )
 
 
-def chapter(request, id):
-    chap = cache.get(f"chapter_{id}")
+def download(request, id):
+    novel = get_novel(id)
+    try:
+        path, version = get_book(id)
+    except BuildFailed:
+        response = JsonResponse({"error": "The book could not be built"}, status=503)
+        response["Retry-After"] = RETRY_AFTER
+        return response
+
+    if path is None:
+        # Being built; the client polls until it gets the file.
+        response = JsonResponse({"status": "building"}, status=202)
+        response["Retry-After"] = RETRY_AFTER
+        return response
+    return serve_book(request, path, f"{novel.title}.epub", f'"{id}-{version}"')
 
-    if chap:
-        novel = cache.get(f"novel_{chap.novel.id}")
-    else:
-        chap = get_object_or_404(Chapter, pk=id)
-        novel = get_object_or_404(Novel, pk=chap.novel.id)
 
-        cache.set(f"chapter_{id}", chap, 300)
-        cache.set(f"novel_{novel.id}", novel)
+def chapter(request, id):
+    chap = get_chapter(id)
+    novel = chap.novel = get_novel(chap.novel_id)
 
     if request.user.is_authenticated:
-        try:
-            b = Bookmark.objects.get(user=request.user, novel=novel)
-            if b:
-                b.delete()
-        except Exception:
-            pass
-        Bookmark.objects.update_or_create(user=request.user, novel=novel, chapter=chap)
+        record_progress(request.user.id, novel.id, chap.id)
+
+    record_view(chap.id, novel.id)
+
+    def render_chapter():
+        chapter = chap.view()
+        chapter["views"] += pending_chapter_views([chap.id])[chap.id]
+        return render_chapter_page(request, chapter)
+
+    tags = [f"chapter:{chap.id}", f"novel:{novel.id}"]
+    return respond(
+        request,
+        page_etag(request, tags),
+        render_chapter,
+        page_modified(request.user, tags),
+    )
 
-    novel.views += 1
-    chap.views += 1
 
-    novel.save()
-    chap.save()
+async def achapter(request, id):
+    chap, user = await asyncio.gather(aget_chapter(id), request.auser())
+    # Templates read request.user; give them the user that is already
+    # loaded instead of a lazy object that would query synchronously.
+    request.user = user
+
+    writes = [arecord_view(chap.id, chap.novel_id)]
+    if user.is_authenticated:
+        writes.append(arecord_progress(user.id, chap.novel_id, chap.id))
+    tags = [f"chapter:{chap.id}", f"novel:{chap.novel_id}"]
+    chap.novel, etag, last_modified, *_ = await asyncio.gather(
+        aget_novel(chap.novel_id),
+        apage_etag(user, tags),
+        apage_modified(user, tags),
+        *writes,
+    )
+
+    async def render_chapter():
+        chapter, pending = await asyncio.gather(
+            chap.aview(), apending_chapter_views([chap.id])
+        )
+        chapter["views"] += pending[chap.id]
+        return render_chapter_page(request, chapter)
+
+    return await arespond(request, user, etag, render_chapter, last_modified)
+
+
+def render_chapter_page(request, chapter):
     return render(
         request,
         "novel/chapter.html",
         {
-            "chapter": chap.view(),
+            "chapter": chapter,
         },
     )
 
@@ -904,13 +1053,6 @@ def delete(request, view, id):
 
     object.delete()
 
-    if view == "novel":
-        cache.delete("novels")
-        cache.delete(f"novel_{object.id}")
-
-    else:
-        cache.delete(f"chapters_{object.novel.id}")
-        cache.delete(f"chapter_{object.id}")
     if view == "novel":
         return HttpResponseRedirect(
             reverse("profile", kwargs={"username": user.username})